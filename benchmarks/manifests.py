@@ -0,0 +1,38 @@
+VIDEO_BANDWIDTHS = (300000, 600000, 1200000, 2400000, 4800000, 7200000)
+AUDIO_BANDWIDTH = 96000
+TIMESCALE = 1000
+SEGMENT_DURATION = 3840
+
+def segment_timeline(segments, compact):
+    if compact:
+        return (f'<S t="0" d="{SEGMENT_DURATION}" r="{segments - 2}"/>'
+                f'<S d="{SEGMENT_DURATION // 2}"/>')
+    return ''.join(f'<S d="{SEGMENT_DURATION + i % 2}"/>'
+                   for i in range(segments))
+
+def representation(rep_id, bandwidth, attributes, segments, compact):
+    return (f'<Representation id="{rep_id}" bandwidth="{bandwidth}" '
+            f'{attributes}>'
+            f'<SegmentTemplate timescale="{TIMESCALE}" '
+            f'initialization="{rep_id}-init.mp4" '
+            f'media="{rep_id}-$Number$.mp4" startNumber="1">'
+            f'<SegmentTimeline>{segment_timeline(segments, compact)}'
+            '</SegmentTimeline></SegmentTemplate></Representation>')
+
+def dash_manifest(base_url, segments, compact=True):
+    videos = ''.join(representation(
+        f'dash-video={bandwidth}', bandwidth,
+        'codecs="avc1.64001f" mimeType="video/mp4" '
+        f'width="{bandwidth // 5000}" height="{bandwidth // 8888}"',
+        segments, compact) for bandwidth in VIDEO_BANDWIDTHS)
+    audio = representation(
+        f'dash-audio={AUDIO_BANDWIDTH}', AUDIO_BANDWIDTH,
+        'codecs="mp4a.40.2" mimeType="audio/mp4" audioSamplingRate="48000"',
+        segments, compact)
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static">'
+            f'<BaseURL>{base_url}</BaseURL><Period id="0">'
+            f'<AdaptationSet contentType="video">{videos}</AdaptationSet>'
+            '<AdaptationSet contentType="audio" lang="sv">'
+            '<Role schemeIdUri="urn:mpeg:dash:role:2011" value="main"/>'
+            f'{audio}</AdaptationSet></Period></MPD>').encode('utf8')
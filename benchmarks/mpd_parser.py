@@ -0,0 +1,56 @@
+import timeit
+import warnings
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+import mpd
+from benchmarks.manifests import dash_manifest
+
+BASE_URL = 'https://example.com/d0/se/20200101/abc/'
+SEGMENTS = (500, 2000, 5000)
+REPEATS = 5
+
+def soup_n_segments(segment_timeline):
+    segments = 0
+    for segment in segment_timeline.find_all('s'):
+        segments += 1
+        subsequent_segments = segment.get('r')
+        if subsequent_segments is None:
+            continue
+        for _ in range(int(subsequent_segments)):
+            segments += 1
+    return segments
+
+def soup_parse(manifest):
+    soup = BeautifulSoup(manifest.decode('utf8'), 'lxml')
+    base_url = soup.find('baseurl').text
+    counts = []
+    for adaptation_set in soup.find_all('adaptationset'):
+        for rep in adaptation_set.find_all('representation'):
+            segment_template = rep.find('segmenttemplate')
+            segment_timeline = segment_template.find('segmenttimeline')
+            counts.append(soup_n_segments(segment_timeline))
+    return base_url, counts
+
+def lxml_parse(manifest):
+    parsed = mpd.parse(manifest)
+    return parsed.base_url, [rep.segment_template.count
+                             for adaptation_set in parsed.adaptation_sets
+                             for rep in adaptation_set.representations]
+
+def main():
+    warnings.filterwarnings('ignore', category=XMLParsedAsHTMLWarning)
+    print(f"{'segments':>8} {'timeline':>8} {'soup ms':>10} "
+          f"{'lxml ms':>10} {'speedup':>8}")
+    for segments in SEGMENTS:
+        for compact in (True, False):
+            manifest = dash_manifest(BASE_URL, segments, compact)
+            assert soup_parse(manifest) == lxml_parse(manifest)
+            soup = min(timeit.repeat(lambda: soup_parse(manifest),
+                                     number=1, repeat=REPEATS))
+            lxml = min(timeit.repeat(lambda: lxml_parse(manifest),
+                                     number=1, repeat=REPEATS))
+            print(f"{segments:>8} {'r' if compact else 'S':>8} "
+                  f"{soup * 1000:>10.2f} {lxml * 1000:>10.2f} "
+                  f"{soup / lxml:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
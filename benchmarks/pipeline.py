@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from dotenv import load_dotenv
+from aiohttp import web
+import videos_downloader
+import segments_downloader
+import metrics
+from db import DB
+from benchmarks import stand_in
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'schema.sql')
+
+def start_stand_in(app):
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = runner.addresses[0][1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}'
+
+def reset_schema(database):
+    with database._conn, database._conn.cursor() as curs:
+        curs.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        with open(SCHEMA, encoding='utf8') as schema:
+            curs.execute(schema.read())
+
+def timed_store(database, stats):
+    store = database.store
+
+    def wrapper(**kwargs):
+        start = time.perf_counter()
+        store(**kwargs)
+        stats['store_seconds'] += time.perf_counter() - start
+        stats['stored_videos'] += len(kwargs.get('video_encodings', ()))
+    return wrapper
+
+def run(args):
+    load_dotenv()
+    if not os.environ.get('BENCHMARK_DB_NAME'):
+        raise SystemExit("Set BENCHMARK_DB_NAME to a database the benchmark "
+                         "may wipe")
+    os.environ['DB_NAME'] = os.environ['BENCHMARK_DB_NAME']
+
+    app = stand_in.make_app(args.programs, args.episodes, args.segments,
+                            args.latency, args.error_rate,
+                            brownout=args.brownout)
+    url = start_stand_in(app)
+    videos_downloader.API_URL = url
+    segments_downloader.API_URL = url
+    segments_downloader.REFRESH_SECONDS = 0
+
+    database = DB()
+    stats = {'store_seconds': 0.0, 'stored_videos': 0}
+    cwd = os.getcwd()
+    try:
+        reset_schema(database)
+        database.store = timed_store(database, stats)
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+
+            start = time.perf_counter()
+            videos_downloader.download(database)
+            catalog_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            segments_downloader.download(database)
+            segments_seconds = time.perf_counter() - start
+
+            head_requests = app['requests']['head']
+            start = time.perf_counter()
+            segments_downloader.download(database, refresh=True)
+            refresh_seconds = time.perf_counter() - start
+            refresh_heads = app['requests']['head'] - head_requests
+
+            start = time.perf_counter()
+            database.export('export.csv', 'export_intl.csv', 'export.bin')
+            export_seconds = time.perf_counter() - start
+            export_bytes = sum(os.path.getsize(name) for name in
+                               ('export.csv', 'export_intl.csv', 'export.bin'))
+    finally:
+        os.chdir(cwd)
+        database.close()
+
+    requests = app['requests']
+    videos = args.programs * args.episodes
+    print(f"catalog   {videos} videos in {catalog_seconds:.2f} s "
+          f"({videos / catalog_seconds:.0f} videos/s)")
+    print(f"segments  {stats['stored_videos']} videos in "
+          f"{segments_seconds:.2f} s "
+          f"({stats['stored_videos'] / segments_seconds:.2f} videos/s, "
+          f"{requests['head'] / segments_seconds:.0f} HEADs/s, "
+          f"{requests['head_errors']} HEAD errors)")
+    if args.brownout:
+        parked = sum(video['outcome'] == 'parked'
+                     for video in metrics.videos)
+        trips = sum(value for (name, _), value in metrics.counters.items()
+                    if name == 'circuit_trips_total')
+        print(f"brownout  {parked} videos parked after {trips} circuit "
+              f"trip(s), {stats['stored_videos']} of {videos} measured")
+    print(f"refresh   {videos} videos in {refresh_seconds:.2f} s "
+          f"({requests['manifest_not_modified']} manifests not modified, "
+          f"{refresh_heads} HEADs)")
+    print(f"store     {stats['stored_videos']} videos in "
+          f"{stats['store_seconds']:.2f} s "
+          f"({stats['stored_videos'] / max(stats['store_seconds'], 1e-9):.0f}"
+          " videos/s)")
+    print(f"export    {export_bytes} B in {export_seconds:.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the pipeline against a local stand-in SVT API")
+    parser.add_argument('--programs', type=int, default=stand_in.PROGRAMS)
+    parser.add_argument('--episodes', type=int, default=stand_in.EPISODES)
+    parser.add_argument('--segments', type=int, default=stand_in.SEGMENTS)
+    parser.add_argument('--latency', type=float, default=stand_in.LATENCY)
+    parser.add_argument('--error-rate', type=float,
+                        default=stand_in.ERROR_RATE)
+    parser.add_argument('--brownout', type=float, nargs=2,
+                        metavar=('START', 'DURATION'))
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format='%(asctime)s %(levelname)s: %(message)s')
+    run(args)
+
+if __name__ == '__main__':
+    main()
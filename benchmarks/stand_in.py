@@ -0,0 +1,111 @@
+import zlib
+import time
+import random
+import asyncio
+from collections import Counter
+from aiohttp import web
+from benchmarks.manifests import dash_manifest, SEGMENT_DURATION, TIMESCALE
+
+PROGRAMS = 20
+EPISODES = 5
+SEGMENTS = 200
+LATENCY = 0.02
+ERROR_RATE = 0.0
+GENRES = 10
+
+def video_id(program, episode):
+    return f'{program:04d}{episode:03d}'
+
+def catalog(programs, episodes, segments, genres):
+    duration = segments * SEGMENT_DURATION // TIMESCALE
+    flat, all_episodes = [], []
+    for program in range(programs):
+        program_episodes = []
+        for episode in range(episodes):
+            svtplay_id = video_id(program, episode)
+            program_episodes.append({
+                'videoSvtId': svtplay_id,
+                'name': f'Avsnitt {episode + 1}',
+                'duration': duration,
+                'validFrom': '2020-01-01T00:00:00+01:00',
+                'validTo': '2099-01-01T00:00:00+01:00',
+                'restrictions': {'onlyAvailableInSweden': episode % 2 == 0},
+                'shortDescription': 'Kort beskrivning.',
+                'longDescription': 'En längre beskrivning. ' * 20,
+                'productionYear': 2020,
+                'genres': [{'id': f'genre-{program % genres}'}]
+                })
+            all_episodes.append({'videoSvtId': svtplay_id,
+                                 'urls': {'svtplay': f'/video/{svtplay_id}'}})
+        flat.append({'name': f'Program {program}',
+                     'episodes': program_episodes,
+                     'urls': {'svtplay': f'/program-{program}'}})
+    return {'data': {
+        'genresSortedByName': {'genres': [
+            {'id': f'genre-{genre}', 'name': f'Genre {genre}',
+             'description': f'Beskrivning {genre}'}
+            for genre in range(genres)]},
+        'allEpisodesForInternalUse': all_episodes,
+        'programAtillO': {'flat': flat}
+        }}
+
+def make_app(programs=PROGRAMS, episodes=EPISODES, segments=SEGMENTS,
+             latency=LATENCY, error_rate=ERROR_RATE, genres=GENRES,
+             seed=0, brownout=None):
+    requests = Counter()
+    started = []
+    rng = random.Random(seed)
+    graphql = catalog(programs, episodes, segments, genres)
+
+    async def respond(kind):
+        requests[kind] += 1
+        if not started:
+            started.append(time.monotonic())
+        if latency:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * latency)
+        # Every request fails during a brownout, given as (start, duration)
+        # in seconds after the first request.
+        failing = (brownout is not None
+                   and 0 <= time.monotonic() - started[0] - brownout[0]
+                   < brownout[1])
+        if failing or rng.random() < error_rate:
+            requests[kind + '_errors'] += 1
+            raise web.HTTPServiceUnavailable()
+
+    async def contento(request):
+        await respond('graphql')
+        return web.json_response(graphql)
+
+    async def video(request):
+        await respond('video')
+        svtplay_id = request.match_info['svtplay_id']
+        manifest = f'{request.url.origin()}/manifests/{svtplay_id}.mpd'
+        return web.json_response({'videoReferences': [
+            {'format': 'hls', 'url': manifest.replace('.mpd', '.m3u8')},
+            {'format': 'dash', 'url': manifest + '?alt=1'}
+            ]})
+
+    async def ditto(request):
+        await respond('manifest')
+        svtplay_id = request.query['manifestUrl'].rsplit('/', 1)[1][:7]
+        base_url = f'{request.url.origin()}/segments/{svtplay_id}/'
+        body = dash_manifest(base_url, segments)
+        etag = f'"{zlib.crc32(body):08x}"'
+        if request.headers.get('If-None-Match') == etag:
+            requests['manifest_not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, headers={'ETag': etag},
+                            content_type='application/dash+xml')
+
+    async def segment(request):
+        await respond('head')
+        size = 1000 + zlib.crc32(request.match_info['name'].encode()) % 100000
+        return web.Response(headers={'Content-Length': str(size)})
+
+    app = web.Application()
+    app['requests'] = requests
+    app.router.add_post('/contento/graphql', contento)
+    app.router.add_get('/video/{svtplay_id}', video)
+    app.router.add_get('/ditto/api/V1/web', ditto)
+    app.router.add_route('HEAD', '/segments/{svtplay_id}/{name}', segment)
+    return app
@@ -0,0 +1,35 @@
+import os
+import json
+import logging
+from files import write_atomically
+
+CHECKPOINT_DIR = 'checkpoints'
+
+def checkpoint_path(svtplay_id):
+    return os.path.join(CHECKPOINT_DIR, f'{svtplay_id}.json')
+
+def load(svtplay_id):
+    try:
+        with open(checkpoint_path(svtplay_id), encoding='utf8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as ex:
+        logging.warning("Ignoring unreadable checkpoint for %s: %s",
+                        svtplay_id, ex)
+        return {}
+
+def save(svtplay_id, progress):
+    measured = sum(size is not None
+                   for sizes in progress.values() for size in sizes)
+    if not measured:
+        return
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    write_atomically(checkpoint_path(svtplay_id), json.dumps(progress))
+    logging.info("Checkpointed %i segment sizes for %s", measured, svtplay_id)
+
+def discard(svtplay_id):
+    try:
+        os.remove(checkpoint_path(svtplay_id))
+    except FileNotFoundError:
+        pass
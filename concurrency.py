@@ -0,0 +1,273 @@
+import time
+import logging
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import aiohttp
+import metrics
+
+LATENCY_SMOOTHING = 0.1
+BASELINE_SMOOTHING = 0.005
+LATENCY_TOLERANCE = 2.0
+DECREASE_COOLDOWN = 1.0
+ERROR_SMOOTHING = 0.01
+ERROR_THRESHOLD = 0.05
+# A host's circuit opens when half of its last BREAKER_WINDOW requests were
+# overload failures, and closes again after PROBE_SUCCESSES probes in a row
+# succeed, sending at most PROBES requests at a time while half-open.
+BREAKER_WINDOW = 50
+BREAKER_THRESHOLD = 0.5
+BREAKER_COOLDOWN = 15.0
+MAX_BREAKER_COOLDOWN = 300.0
+PROBES = 2
+PROBE_SUCCESSES = 5
+# Retries are paid from a budget shared by all requests, refilled by a
+# fraction of every success and a small steady rate.
+RETRY_RATIO = 0.1
+RETRY_RATE = 5.0
+RETRY_BURST = 100.0
+
+class FailFastError(Exception):
+    pass
+
+class CircuitOpenError(FailFastError):
+    def __init__(self, host):
+        super().__init__(f"circuit for {host} is open")
+
+class RetryBudgetError(FailFastError):
+    def __init__(self, host):
+        super().__init__(f"retry budget exhausted on {host}")
+
+def overloaded(ex):
+    if isinstance(ex, aiohttp.ClientResponseError):
+        return ex.status == 429 or ex.status >= 500
+    return isinstance(ex, (aiohttp.ClientConnectionError,
+                           asyncio.TimeoutError))
+
+class CircuitBreaker:
+    def __init__(self, host):
+        self.host = host
+        self.state = 'closed'
+        self.trips = 0
+        self._outcomes = deque(maxlen=BREAKER_WINDOW)
+        self._cooldown = BREAKER_COOLDOWN
+        self._opened_at = 0.0
+        self._probes = 0
+        self._successes = 0
+        self._waiters = deque()
+
+    def remaining(self):
+        if self.state != 'open':
+            return 0.0
+        remaining = self._opened_at + self._cooldown - time.monotonic()
+        if remaining <= 0:
+            self.state = 'half_open'
+            self._probes = 0
+            self._successes = 0
+            return 0.0
+        return remaining
+
+    async def admit(self):
+        while True:
+            if self.remaining() > 0:
+                raise CircuitOpenError(self.host)
+            if self.state == 'closed':
+                return False
+            if self._probes < PROBES:
+                self._probes += 1
+                return True
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    def release(self, probe):
+        if probe:
+            self._probes = max(self._probes - 1, 0)
+            self._wake(1)
+
+    def record(self, failed, probe):
+        if self.state == 'half_open' and probe:
+            if failed:
+                self._open(min(self._cooldown * 2, MAX_BREAKER_COOLDOWN))
+            else:
+                self._successes += 1
+                if self._successes >= PROBE_SUCCESSES:
+                    self._close()
+        elif self.state == 'closed':
+            self._outcomes.append(failed)
+            if (len(self._outcomes) == BREAKER_WINDOW
+                    and sum(self._outcomes)
+                    >= BREAKER_THRESHOLD * BREAKER_WINDOW):
+                self._open(BREAKER_COOLDOWN)
+
+    def _open(self, cooldown):
+        self.state = 'open'
+        self.trips += 1
+        self._cooldown = cooldown
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._wake()
+        metrics.increment('circuit_trips_total', host=self.host)
+        logging.warning("Circuit for %s opened for %.0f s", self.host,
+                        cooldown)
+
+    def _close(self):
+        self.state = 'closed'
+        self._cooldown = BREAKER_COOLDOWN
+        self._wake()
+        logging.info("Circuit for %s closed", self.host)
+
+    def _wake(self, count=None):
+        while self._waiters and count != 0:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                if count is not None:
+                    count -= 1
+
+class HostLimit:
+    def __init__(self, host, initial, minimum, maximum, backoff_ratio):
+        self.host = host
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.peak = initial
+        self.trough = initial
+        self._baseline = None
+        self._latency = None
+        self._error_rate = 0.0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+
+    async def acquire(self):
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def record_failure(self):
+        self._error_rate += ERROR_SMOOTHING * (1 - self._error_rate)
+        if self._error_rate > ERROR_THRESHOLD:
+            self._decrease()
+
+    def record_success(self, latency):
+        self._error_rate -= ERROR_SMOOTHING * self._error_rate
+        if self._latency is None:
+            self._baseline = self._latency = latency
+        else:
+            self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+            self._baseline += BASELINE_SMOOTHING * (latency - self._baseline)
+
+        if self._latency > self._baseline * LATENCY_TOLERANCE:
+            self._decrease()
+        else:
+            self.limit = min(self.limit + 1 / self.limit, self.maximum)
+            self.peak = max(self.peak, int(self.limit))
+            self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < max(self._latency or 0,
+                                           DECREASE_COOLDOWN):
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * self.backoff_ratio, self.minimum)
+        self.trough = min(self.trough, int(self.limit))
+
+# Every host gets its own breaker and its own adaptive limit, so a slow or
+# failing host does not throttle the others. The retry budget is shared.
+class AdaptiveLimiter:
+    def __init__(self, initial, minimum, maximum, backoff_ratio=0.7):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff_ratio = backoff_ratio
+        self._breakers = {}
+        self._limits = {}
+        self._retry_tokens = RETRY_BURST
+        self._retry_refilled = time.monotonic()
+
+    @property
+    def trips(self):
+        return sum(breaker.trips for breaker in self._breakers.values())
+
+    @property
+    def limits(self):
+        return tuple(self._limits.values())
+
+    async def available(self):
+        while (delay := max((breaker.remaining()
+                             for breaker in self._breakers.values()),
+                            default=0.0)) > 0:
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def request(self, url):
+        host = urlsplit(url).hostname
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host)
+            self._limits[host] = HostLimit(
+                host, self.initial, self.minimum, self.maximum,
+                self.backoff_ratio)
+        limit = self._limits[host]
+        probe = await breaker.admit()
+        try:
+            await limit.acquire()
+            try:
+                if breaker.remaining() > 0:
+                    raise CircuitOpenError(host)
+                start = time.monotonic()
+                try:
+                    yield
+                except Exception as ex:
+                    failed = overloaded(ex)
+                    breaker.record(failed, probe)
+                    if failed:
+                        limit.record_failure()
+                        if not probe and not self._spend_retry():
+                            metrics.increment('retry_budget_exhausted_total',
+                                              host=host)
+                            raise RetryBudgetError(host) from ex
+                    raise
+                else:
+                    breaker.record(False, probe)
+                    limit.record_success(time.monotonic() - start)
+                    self._retry_tokens = min(
+                        self._retry_tokens + RETRY_RATIO, RETRY_BURST)
+            finally:
+                limit.release()
+        finally:
+            breaker.release(probe)
+
+    def _spend_retry(self):
+        now = time.monotonic()
+        self._retry_tokens = min(
+            self._retry_tokens + (now - self._retry_refilled) * RETRY_RATE,
+            RETRY_BURST)
+        self._retry_refilled = now
+        if self._retry_tokens < 1:
+            return False
+        self._retry_tokens -= 1
+        return True
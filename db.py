@@ -1,9 +1,38 @@
 import os
 import logging
 import csv
+from itertools import groupby
+from collections import OrderedDict
+from contextlib import ExitStack
+import json
+import hashlib
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2.extras import execute_values
+from packing import combine_sizes, unpack_sizes
+from segment_file import SegmentFileWriter
+from scheduler import POLICIES
+
+EXPORT_BATCH = 1000
+INSERT_BATCH = 1000
+PURGE_BATCH = 100
+VIDEO_CACHE_SIZE = 4096
+PUBLISHED = """(V.valid_from IS NULL OR V.valid_from <= LOCALTIMESTAMP)
+AND (V.valid_to IS NULL OR V.valid_to > LOCALTIMESTAMP)"""
+DOWNLOAD_CANDIDATES = """NOT EXISTS
+    (SELECT 1
+    FROM VideoEncodings E
+    WHERE E.video = V.id)
+AND """ + PUBLISHED
+REFRESH_CANDIDATES = """EXISTS
+    (SELECT 1
+    FROM VideoEncodings E
+    WHERE E.video = V.id)
+AND """ + PUBLISHED + """
+AND (V.manifest_checked_at IS NULL
+    OR V.manifest_checked_at
+        < CURRENT_TIMESTAMP - %(refresh)s * INTERVAL '1 second')"""
 
 class DB:
     def __init__(self):
@@ -15,38 +44,47 @@ class DB:
                 os.environ.get('DB_PASSWORD'))
             )
 
-        self._videos = self._memo_videos()
+        self._video_info = OrderedDict()
 
     def close(self):
         self._conn.close()
 
-    def export_csv(self, file_name, international=False):
-        with self._conn, self._conn.cursor() as curs:
-            with open(file_name, 'w', newline='', encoding='utf8') as file:
-                curs.execute("""
-                    SELECT id, name, duration, 
-                        segment_length, ARRAY_AGG(combined)
-                    FROM 
-                        (SELECT V.id, name, duration, E1.segment_length,
-                        (SELECT ARRAY_AGG(COALESCE(U.v_sizes + U.a_sizes, 0))
-                        FROM (SELECT UNNEST(E1.segment_sizes) v_sizes, 
-                            UNNEST(E2.segment_sizes) a_sizes) U) AS combined
-                        FROM Videos V
-                        INNER JOIN VideoEncodings AS E1 ON V.id = E1.video
-                        INNER JOIN AudioEncodings AS E2 ON V.id = E2.video
-                        WHERE sweden_only IS FALSE OR sweden_only IS NOT %s
-                        GROUP BY V.id, name, duration, E1.segment_length, 
-                            E1.segment_sizes, E2.segment_sizes) T
-                    GROUP BY id, name, duration, segment_length
-                    ORDER BY name
-                    ;""", (international,))
-
-                csv_writer = csv.writer(file)
-                for row in curs.fetchall():
-                    seg_size_lists = tuple(','.join(map(str, segment_sizes))
-                                          for segment_sizes in row[4])
-                    csv_writer.writerow((row[0], row[1], row[2], row[3])
-                                        + seg_size_lists)
+    def export(self, file_name, intl_file_name, segment_file_name=None):
+        with self._conn, self._conn.cursor('export') as curs, \
+                ExitStack() as files:
+            csv_writer = csv.writer(files.enter_context(
+                open(file_name, 'w', newline='', encoding='utf8')))
+            intl_csv_writer = csv.writer(files.enter_context(
+                open(intl_file_name, 'w', newline='', encoding='utf8')))
+            segment_file = (
+                files.enter_context(SegmentFileWriter(segment_file_name))
+                if segment_file_name else None)
+
+            curs.itersize = EXPORT_BATCH
+            curs.execute("""
+                SELECT V.id, V.name, V.duration, C.segment_length,
+                    C.segment_sizes, V.sweden_only
+                FROM Videos V
+                INNER JOIN CombinedEncodings C ON V.id = C.video
+                ORDER BY V.name, V.id, C.segment_length, C.video_encoding
+                ;""")
+
+            for key, rows in groupby(curs, key=lambda row: row[:4]):
+                combined = []
+                for row in rows:
+                    segment_sizes = bytes(row[4])
+                    if segment_sizes not in combined:
+                        combined.append(segment_sizes)
+                    sweden_only = row[5]
+                seg_size_lists = tuple(
+                    ','.join(map(str, unpack_sizes(segment_sizes)))
+                    for segment_sizes in combined)
+                record = key + seg_size_lists
+                csv_writer.writerow(record)
+                if not sweden_only:
+                    intl_csv_writer.writerow(record)
+                if segment_file is not None:
+                    segment_file.add(*key, sweden_only, combined)
 
     def store(self, **kwargs):
         with self._conn, self._conn.cursor() as curs:
@@ -55,155 +93,452 @@ class DB:
             if videos := kwargs.get('videos'):
                 self._insert_videos(curs, videos)
             if video_encodings := kwargs.get('video_encodings'):
-                self._insert_video_encodings(curs, video_encodings)
-
-    def update(self, raw):
+                video_info = self._lookup_videos(curs, tuple(
+                    encodings['id'] for encodings in video_encodings))
+                for encodings in video_encodings:
+                    self._insert_video_encodings(curs, encodings, video_info)
+            if refreshed_encodings := kwargs.get('refreshed_encodings'):
+                video_info = self._lookup_videos(curs, tuple(
+                    encodings['id'] for encodings in refreshed_encodings))
+                for encodings in refreshed_encodings:
+                    self._refresh_video_encodings(curs, encodings, video_info)
 
-        self._delete_deprecated()
-
-        genres = tuple(format_genre(gen)
-                       for gen in raw['data']['genresSortedByName']['genres'])
-        episode_urls = {ep['videoSvtId']: ep['urls']['svtplay']
-                        for ep in raw['data']['allEpisodesForInternalUse']}
-        videos = tuple(format_episode(vid, ep, episode_urls)
-                       for vid in raw['data']['programAtillO']['flat']
-                       for ep in vid['episodes'])
+    def update(self, genres, episode_urls, programs):
+        genres = tuple(format_genre(gen) for gen in genres)
+        videos = (format_episode(vid, ep, episode_urls)
+                  for vid in programs
+                  for ep in vid['episodes'])
 
         self.store(genres=genres, videos=videos)
-        self._videos = self._memo_videos()
+        self._video_info.clear()
 
     def not_downloaded(self):
         with self._conn, self._conn.cursor() as curs:
             curs.execute("""
-                (SELECT id AS video 
-                FROM Videos)
-                EXCEPT
-                (SELECT DISTINCT video 
-                FROM VideoEncodings)
-                ;""")
-            return tuple(row[0] for row in curs.fetchall())
+                SELECT id, duration, valid_from, valid_to
+                FROM Videos V
+                WHERE {0}
+                ;""".format(DOWNLOAD_CANDIDATES))
+            return curs.fetchall()
 
-    def _memo_videos(self):
+    def stored_manifests(self, svtplay_ids):
         with self._conn, self._conn.cursor() as curs:
-            curs.execute("SELECT * FROM Videos;")
-            return {video_row[0]: video_row[1:]
-                    for video_row in curs.fetchall()}
+            curs.execute("""
+                SELECT id, manifest_fingerprint, manifest_etag
+                FROM Videos
+                WHERE id = ANY(%s::CHAR(7)[])
+                ;""", (list(svtplay_ids),))
+            manifests = {
+                svtplay_id: {'manifest_fingerprint': manifest_fingerprint,
+                             'manifest_etag': manifest_etag,
+                             'videos': [], 'audio': []}
+                for svtplay_id, manifest_fingerprint, manifest_etag
+                in curs.fetchall()}
+            for table, kind in (('VideoEncodings', 'videos'),
+                                ('AudioEncodings', 'audio')):
+                curs.execute("""
+                    SELECT video, id, fingerprint, bandwidth, codecs,
+                        segment_length, LENGTH(segment_sizes) / 4
+                    FROM {0}
+                    WHERE video = ANY(%s::CHAR(7)[])
+                    ;""".format(table), (list(manifests),))
+                for (svtplay_id, encoding_id, encoding_fingerprint, bandwidth,
+                     codecs, segment_length, count) in curs.fetchall():
+                    manifests[svtplay_id][kind].append({
+                        'id': encoding_id,
+                        'fingerprint': encoding_fingerprint,
+                        'bandwidth': bandwidth,
+                        'codecs': codecs,
+                        'segment_length': segment_length,
+                        'count': count
+                        })
+            return manifests
 
-    def _delete_deprecated(self):
+    def claim(self, owner, limit, lease_seconds, policy,
+              refresh_seconds=None, exclude=()):
+        if refresh_seconds is None:
+            candidates, order = DOWNLOAD_CANDIDATES, POLICIES[policy].order_by
+        else:
+            candidates = REFRESH_CANDIDATES
+            order = ('V.manifest_checked_at ASC NULLS FIRST, '
+                     + POLICIES[policy].order_by)
         with self._conn, self._conn.cursor() as curs:
             curs.execute("""
-                DELETE FROM Videos
-                WHERE valid_to < CURRENT_TIMESTAMP
-                OR valid_from > CURRENT_TIMESTAMP
-                ;""")
-            logging.info("Deleted %i deprecated videos", curs.rowcount)
+                WITH Candidates AS
+                    (SELECT V.id
+                    FROM Videos V
+                    WHERE {0}
+                    AND V.id <> ALL(%(exclude)s::CHAR(7)[])
+                    AND NOT EXISTS
+                        (SELECT 1
+                        FROM VideoLeases L
+                        WHERE L.video = V.id
+                        AND L.expires_at > CURRENT_TIMESTAMP)
+                    ORDER BY {1}
+                    LIMIT %(limit)s
+                    FOR NO KEY UPDATE OF V SKIP LOCKED),
+                Claimed AS
+                    (INSERT INTO VideoLeases AS L (video, owner, expires_at)
+                    SELECT id, %(owner)s,
+                        CURRENT_TIMESTAMP + %(lease)s * INTERVAL '1 second'
+                    FROM Candidates
+                    ON CONFLICT (video) DO UPDATE SET
+                        owner = EXCLUDED.owner,
+                        expires_at = EXCLUDED.expires_at
+                    WHERE L.expires_at <= CURRENT_TIMESTAMP
+                    RETURNING video)
+                SELECT V.id, V.duration, V.valid_from, V.valid_to
+                FROM Videos V
+                INNER JOIN Claimed C ON V.id = C.video
+                ;""".format(candidates, order),
+                {'owner': owner, 'limit': limit, 'lease': lease_seconds,
+                 'refresh': refresh_seconds, 'exclude': list(exclude)})
+            return curs.fetchall()
 
-    def _insert_genres(self, curs, genres):
-        for genre in genres:
+    def leased_elsewhere(self, owner, refresh_seconds=None):
+        candidates = (DOWNLOAD_CANDIDATES if refresh_seconds is None
+                      else REFRESH_CANDIDATES)
+        with self._conn, self._conn.cursor() as curs:
+            curs.execute("""
+                SELECT COUNT(*)
+                FROM Videos V
+                INNER JOIN VideoLeases L ON V.id = L.video
+                WHERE {0}
+                AND L.owner <> %(owner)s
+                AND L.expires_at > CURRENT_TIMESTAMP
+                ;""".format(candidates),
+                {'owner': owner, 'refresh': refresh_seconds})
+            return curs.fetchone()[0]
+
+    def heartbeat(self, owner, lease_seconds):
+        with self._conn, self._conn.cursor() as curs:
+            curs.execute("""
+                UPDATE VideoLeases
+                SET expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE owner = %s
+                ;""", (lease_seconds, owner))
+            return curs.rowcount
+
+    def purge(self):
+        purged = 0
+        while True:
+            with self._conn, self._conn.cursor() as curs:
+                curs.execute("""
+                    DELETE FROM Videos
+                    WHERE id IN
+                        (SELECT id
+                        FROM Videos
+                        WHERE valid_to < LOCALTIMESTAMP
+                        ORDER BY valid_to
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED)
+                    ;""", (PURGE_BATCH,))
+                deleted = curs.rowcount
+            purged += deleted
+            if deleted < PURGE_BATCH:
+                break
+        logging.info("Purged %i expired videos", purged)
+        return purged
+
+    def release(self, owner, svtplay_ids=None):
+        with self._conn, self._conn.cursor() as curs:
+            if svtplay_ids is None:
+                curs.execute("DELETE FROM VideoLeases WHERE owner = %s;",
+                             (owner,))
+            else:
+                curs.execute("""
+                    DELETE FROM VideoLeases
+                    WHERE owner = %s
+                    AND video = ANY(%s::CHAR(7)[])
+                    ;""", (owner, list(svtplay_ids)))
+            return curs.rowcount
+
+    def _lookup_videos(self, curs, svtplay_ids):
+        missing = [svtplay_id for svtplay_id in svtplay_ids
+                   if svtplay_id not in self._video_info]
+        if missing:
             curs.execute("""
-                INSERT INTO Genres AS G
-                VALUES (%(id)s, %(name)s, %(description)s)
-                ON CONFLICT (id) DO UPDATE SET 
-                    name = EXCLUDED.name,
-                    description = EXCLUDED.description
-                WHERE
-                    G.name <> EXCLUDED.name OR
-                    G.description <> EXCLUDED.description
-                ;""", genre)
+                SELECT id, name, duration
+                FROM Videos
+                WHERE id = ANY(%s::CHAR(7)[])
+                ;""", (missing,))
+            for svtplay_id, name, duration in curs.fetchall():
+                self._video_info[svtplay_id] = (name, duration)
+        video_info = {}
+        for svtplay_id in svtplay_ids:
+            if svtplay_id in self._video_info:
+                self._video_info.move_to_end(svtplay_id)
+                video_info[svtplay_id] = self._video_info[svtplay_id]
+        while len(self._video_info) > VIDEO_CACHE_SIZE:
+            self._video_info.popitem(last=False)
+        return video_info
+
+    def _insert_genres(self, curs, genres):
+        unique_genres = {genre['id']: genre for genre in genres}
+        execute_values(curs, """
+            INSERT INTO Genres AS G (id, name, description)
+            VALUES %s
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name,
+                description = EXCLUDED.description
+            WHERE
+                G.name <> EXCLUDED.name OR
+                G.description <> EXCLUDED.description
+            ;""", tuple(unique_genres.values()),
+            template="(%(id)s, %(name)s, %(description)s)")
 
     def _insert_videos(self, curs, videos):
-        affected_rows = 0
+        curs.execute("SELECT id, fingerprint FROM Videos;")
+        fingerprints = dict(curs.fetchall())
+        curs.execute("""
+            CREATE TEMP TABLE StagedVideos (
+                seq SERIAL,
+                LIKE Videos,
+                genres TEXT[] NOT NULL
+            ) ON COMMIT DROP
+            ;""")
+
+        # An episode listed under several programs keeps its last listing.
+        # Only the fingerprint of each id's last listing is kept here, every
+        # changed listing is staged and superseded ones are dropped below.
+        seen = {}
+        rows = []
         for video in videos:
-            if not active(video):
+            if expired(video):
                 continue
             if len(video['id']) != 7:
                 logging.warning("Cannot insert [%s] with unexpected id [%s]",
                                 video['name'], video['id'])
                 continue
+            video_fingerprint = seen[video['id']] = fingerprint(video)
+            if fingerprints.get(video['id']) == video_fingerprint:
+                continue
+            rows.append((video['id'], video['name'], video['duration'],
+                         video['valid_from'], video['valid_to'],
+                         video['sweden_only'], video['url'],
+                         video['short_description'],
+                         video['long_description'],
+                         video['production_year'], video_fingerprint,
+                         list(video['genres'])))
+            if len(rows) == INSERT_BATCH:
+                self._stage_videos(curs, rows)
+                rows = []
+        self._stage_videos(curs, rows)
+
+        added, changed, unchanged = 0, 0, []
+        for svtplay_id, video_fingerprint in seen.items():
+            if svtplay_id not in fingerprints:
+                added += 1
+            elif fingerprints[svtplay_id] != video_fingerprint:
+                changed += 1
+            else:
+                unchanged.append(svtplay_id)
+        if unchanged:
             curs.execute("""
-                INSERT INTO Videos AS V
-                VALUES (%(id)s, %(name)s, %(duration)s, %(valid_from)s,
-                    %(valid_to)s, %(sweden_only)s, %(url)s,
-                    %(short_description)s, %(long_description)s,
-                    %(production_year)s)
-                ON CONFLICT (id) DO UPDATE SET 
-                    name = EXCLUDED.name,
-                    duration = EXCLUDED.duration,
-                    valid_from = EXCLUDED.valid_from,
-                    valid_to = EXCLUDED.valid_to,
-                    sweden_only = EXCLUDED.sweden_only,
-                    url = EXCLUDED.url,
-                    short_description = EXCLUDED.short_description,
-                    long_description = EXCLUDED.long_description,
-                    production_year = EXCLUDED.production_year
-                WHERE
-                    V.name <> EXCLUDED.name OR
-                    V.duration <> EXCLUDED.duration OR
-                    V.valid_from <> EXCLUDED.valid_from OR
-                    V.valid_to <> EXCLUDED.valid_to OR
-                    V.sweden_only <> EXCLUDED.sweden_only OR
-                    V.url <> EXCLUDED.url OR
-                    V.short_description <> EXCLUDED.short_description OR
-                    V.long_description <> EXCLUDED.long_description OR
-                    V.production_year <> EXCLUDED.production_year
-                ;""", video)
-            affected_rows += curs.rowcount
-
-            self._insert_video_genres(curs, video)
-
-        logging.info("Added/updated %i videos", affected_rows)
-
-    def _insert_video_genres(self, curs, video):
-        if video['genres']:
-            curs.execute("""
-                DELETE FROM VideoGenres
-                WHERE video = %s AND genre NOT IN %s
-                ;""", (video['id'], video['genres']))
+                DELETE FROM StagedVideos
+                WHERE id = ANY(%s::CHAR(7)[])
+                ;""", (unchanged,))
+        curs.execute("""
+            DELETE FROM StagedVideos S
+            USING StagedVideos T
+            WHERE S.id = T.id AND S.seq < T.seq
+            ;""")
+        curs.execute("""
+            INSERT INTO Videos AS V
+                (id, name, duration, valid_from, valid_to, sweden_only, url,
+                short_description, long_description, production_year,
+                fingerprint)
+            SELECT id, name, duration, valid_from, valid_to, sweden_only, url,
+                short_description, long_description, production_year,
+                fingerprint
+            FROM StagedVideos
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name,
+                duration = EXCLUDED.duration,
+                valid_from = EXCLUDED.valid_from,
+                valid_to = EXCLUDED.valid_to,
+                sweden_only = EXCLUDED.sweden_only,
+                url = EXCLUDED.url,
+                short_description = EXCLUDED.short_description,
+                long_description = EXCLUDED.long_description,
+                production_year = EXCLUDED.production_year,
+                fingerprint = EXCLUDED.fingerprint
+            ;""")
+        self._insert_video_genres(curs)
 
-        for genre_id in video['genres']:
+        # Videos missing from the catalog expire now and are deleted in
+        # batches by purge, outside of this transaction.
+        removed = [svtplay_id for svtplay_id in fingerprints
+                   if svtplay_id not in seen]
+        if not seen and removed:
+            logging.warning("Catalog has no active videos, keeping %i "
+                            "stored videos", len(removed))
+            removed = []
+        withdrawn = 0
+        if removed:
             curs.execute("""
-                INSERT INTO VideoGenres
-                VALUES (%s, %s)
-                ON CONFLICT (video, genre) DO NOTHING
-                ;""", (video['id'], genre_id))
+                UPDATE Videos
+                SET valid_to = LOCALTIMESTAMP,
+                    fingerprint = NULL
+                WHERE id = ANY(%s::CHAR(7)[])
+                AND (valid_to IS NULL OR valid_to > LOCALTIMESTAMP)
+                ;""", (removed,))
+            withdrawn = curs.rowcount
+
+        logging.info("Added %i, changed %i, unchanged %i and withdrew %i "
+                     "videos", added, changed, len(unchanged), withdrawn)
+
+    def _stage_videos(self, curs, rows):
+        execute_values(curs, """
+            INSERT INTO StagedVideos
+                (id, name, duration, valid_from, valid_to, sweden_only, url,
+                short_description, long_description, production_year,
+                fingerprint, genres)
+            VALUES %s
+            ;""", rows, page_size=INSERT_BATCH)
 
-    def _insert_video_encodings(self, curs, video_encodings):
+    def _insert_video_genres(self, curs):
+        curs.execute("""
+            DELETE FROM VideoGenres VG
+            USING StagedVideos S
+            WHERE VG.video = S.id
+                AND CARDINALITY(S.genres) > 0
+                AND VG.genre <> ALL(S.genres)
+            ;""")
+        curs.execute("""
+            INSERT INTO VideoGenres (video, genre)
+            SELECT DISTINCT S.id, G.genre
+            FROM StagedVideos S
+            CROSS JOIN UNNEST(S.genres) AS G(genre)
+            ON CONFLICT (video, genre) DO NOTHING
+            ;""")
+
+    def _insert_video_encodings(self, curs, video_encodings, video_info):
         svtplay_id = video_encodings['id']
-        videos = video_encodings['videos']
         audio = video_encodings['audio']
 
         videos_inserted = 0
-        for video in videos:
+        for video in video_encodings['videos']:
+            videos_inserted += self._insert_video_encoding(
+                curs, svtplay_id, video, audio['segment_sizes'])
+        audio_inserted = self._insert_audio_encoding(curs, svtplay_id, audio)
+        self._update_manifest(curs, video_encodings)
+
+        name, duration = video_info[svtplay_id]
+        logging.info("[%s] [%s] [%s] - stored %i video encoding(s) and "
+                     "%i audio encoding",
+                     svtplay_id, name, timedelta(seconds=duration),
+                     videos_inserted, audio_inserted)
+
+    def _refresh_video_encodings(self, curs, refreshed, video_info):
+        svtplay_id = refreshed['id']
+        self._update_manifest(curs, refreshed)
+        if refreshed['keep'] is None:
+            return
+
+        keep_ids = [encoding_id for encoding_id, _ in refreshed['keep']]
+        curs.execute("""
+            DELETE FROM VideoEncodings
+            WHERE video = %s
+            AND id <> ALL(%s::INTEGER[])
+            ;""", (svtplay_id, keep_ids))
+        videos_removed = curs.rowcount
+        curs.executemany("""
+            UPDATE VideoEncodings
+            SET fingerprint = %s
+            WHERE id = %s
+            ;""", [(encoding_fingerprint, encoding_id)
+                   for encoding_id, encoding_fingerprint
+                   in refreshed['keep']])
+
+        audio = refreshed['audio']
+        if audio is None:
+            curs.execute("""
+                UPDATE AudioEncodings
+                SET fingerprint = %s
+                WHERE video = %s
+                RETURNING segment_sizes
+                ;""", (refreshed['audio_fingerprint'], svtplay_id))
+            audio_sizes = bytes(curs.fetchone()[0])
+        else:
+            curs.execute("DELETE FROM AudioEncodings WHERE video = %s;",
+                         (svtplay_id,))
+            self._insert_audio_encoding(curs, svtplay_id, audio)
+            audio_sizes = audio['segment_sizes']
             curs.execute("""
-                INSERT INTO VideoEncodings
-                (video, bandwidth, codecs, mime_type, width, height,
-                    segment_length, segment_sizes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ;""", (svtplay_id, video['bandwidth'], video['codecs'],
-                       video['mime_type'], video['width'], video['height'],
-                       video['segment_length'], video['segment_sizes']))
-            videos_inserted += curs.rowcount
+                SELECT id, segment_sizes
+                FROM VideoEncodings
+                WHERE id = ANY(%s::INTEGER[])
+                ;""", (keep_ids,))
+            for encoding_id, segment_sizes in curs.fetchall():
+                curs.execute("""
+                    UPDATE CombinedEncodings
+                    SET segment_sizes = %s
+                    WHERE video_encoding = %s
+                    ;""", (combine_sizes(bytes(segment_sizes), audio_sizes),
+                           encoding_id))
+
+        videos_inserted = 0
+        for video in refreshed['videos']:
+            videos_inserted += self._insert_video_encoding(
+                curs, svtplay_id, video, audio_sizes)
+
+        name, duration = video_info[svtplay_id]
+        logging.info("[%s] [%s] [%s] - refreshed manifest, kept %i, added %i "
+                     "and removed %i video encoding(s), %s audio encoding",
+                     svtplay_id, name, timedelta(seconds=duration),
+                     len(keep_ids), videos_inserted, videos_removed,
+                     'kept' if audio is None else 'replaced')
+
+    def _insert_video_encoding(self, curs, svtplay_id, video, audio_sizes):
+        curs.execute("""
+            INSERT INTO VideoEncodings
+            (video, bandwidth, codecs, mime_type, width, height,
+                segment_length, segment_sizes, fingerprint)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+            ;""", (svtplay_id, video['bandwidth'], video['codecs'],
+                   video['mime_type'], video['width'], video['height'],
+                   video['segment_length'], video['segment_sizes'],
+                   video['fingerprint']))
+        inserted = curs.rowcount
+        curs.execute("""
+            INSERT INTO CombinedEncodings
+            (video_encoding, video, segment_length, segment_sizes)
+            VALUES (%s, %s, %s, %s)
+            ;""", (curs.fetchone()[0], svtplay_id, video['segment_length'],
+                   combine_sizes(video['segment_sizes'], audio_sizes)))
+        return inserted
 
+    def _insert_audio_encoding(self, curs, svtplay_id, audio):
         curs.execute("""
             INSERT INTO AudioEncodings 
             (video, bandwidth, codecs, mime_type, sampling_rate, 
-                segment_length, segment_sizes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+                segment_length, segment_sizes, fingerprint)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             ;""", (svtplay_id, audio['bandwidth'], audio['codecs'],
                    audio['mime_type'], audio['sampling_rate'],
-                   audio['segment_length'], audio['segment_sizes']))
-        audio_inserted = curs.rowcount
+                   audio['segment_length'], audio['segment_sizes'],
+                   audio['fingerprint']))
+        return curs.rowcount
 
-        name, duration, *_ = self._videos[svtplay_id]
-        logging.info("[%s] [%s] [%s] - stored %i video encoding(s) and "
-                     "%i audio encoding",
-                     svtplay_id, name, timedelta(seconds=duration),
-                     videos_inserted, audio_inserted)
+    def _update_manifest(self, curs, video_encodings):
+        curs.execute("""
+            UPDATE Videos
+            SET manifest_fingerprint = %s,
+                manifest_etag = %s,
+                manifest_checked_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+            ;""", (video_encodings['manifest_fingerprint'],
+                   video_encodings['manifest_etag'], video_encodings['id']))
+
+def expired(video):
+    return (datetime.strptime(video['valid_to'], '%Y-%m-%dT%H:%M:%S')
+            <= datetime.now())
 
-def active(video):
-    return (datetime.strptime(video['valid_from'], '%Y-%m-%dT%H:%M:%S')
-            < datetime.now()
-            < datetime.strptime(video['valid_to'], '%Y-%m-%dT%H:%M:%S'))
+def fingerprint(video):
+    content = json.dumps(video, sort_keys=True).encode('utf8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
 
 def format_genre(genre):
     return {
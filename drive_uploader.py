@@ -1,4 +1,9 @@
 import logging
+import gzip
+import shutil
+import hashlib
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -6,14 +11,41 @@ from googleapiclient.http import MediaFileUpload
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 SERVICE_ACCOUNT_FILE = 'service.json'
-FILES = ('svtplay_db.csv', 'svtplay_db_intl.csv')
+FILES = ('svtplay_db.csv', 'svtplay_db_intl.csv', 'svtplay_db.bin')
+GZIP = False
+UPLOAD_WORKERS = 4
+CHUNK_SIZE = 32 * 1024 * 1024
+PAGE_SIZE = 1000
+
+def mime_type(file_name):
+    if file_name.endswith('.gz'):
+        return 'application/gzip'
+    return mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+def md5_checksum(file_name):
+    md5 = hashlib.md5()
+    with open(file_name, 'rb') as file:
+        while block := file.read(1024 * 1024):
+            md5.update(block)
+    return md5.hexdigest()
+
+def gzip_file(file_name):
+    gzip_name = file_name + '.gz'
+    with open(file_name, 'rb') as file, open(gzip_name, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', filename='',
+                           mtime=0) as gzipped:
+            shutil.copyfileobj(file, gzipped)
+    return gzip_name
+
+def media_upload(file_name):
+    return MediaFileUpload(file_name, mimetype=mime_type(file_name),
+                           chunksize=CHUNK_SIZE, resumable=True)
 
 def create_readable_file(service, file_name):
-    media = MediaFileUpload(file_name, mimetype='text/csv', resumable=True)
     file_metadata = {'name': file_name}
     file = service.files().create(
         body=file_metadata,
-        media_body=media,
+        media_body=media_upload(file_name),
         fields='id,size,webContentLink'
         ).execute()
     service.permissions().create(
@@ -24,36 +56,63 @@ def create_readable_file(service, file_name):
                  file_name, file.get('size'), file.get('webContentLink'))
 
 def update_file_content(service, file_id, file_name):
-    media_body = MediaFileUpload(file_name, mimetype='text/csv',
-                                 resumable=True)
     file = service.files().update(
         fileId=file_id,
-        media_body=media_body,
+        media_body=media_upload(file_name),
         fields='version,size'
         ).execute()
     logging.info("Updated %s content on Drive to version %s (%s B)",
                  file_name, file.get('version'), file.get('size'))
 
 def get_files(service):
-    results = service.files().list(
-        pageSize=10,
-        fields='nextPageToken, files(id, name)'
-        ).execute()
-    return results.get('files', [])
+    files = []
+    page_token = None
+    while True:
+        results = service.files().list(
+            pageSize=PAGE_SIZE,
+            pageToken=page_token,
+            q='trashed = false',
+            fields='nextPageToken, files(id, name, md5Checksum)'
+            ).execute()
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if page_token is None:
+            return files
 
-def upload():
+def upload_file(credentials, file_name, remote_file):
+    try:
+        if (remote_file is not None
+                and remote_file.get('md5Checksum') == md5_checksum(file_name)):
+            logging.info("Skipped uploading unchanged %s", file_name)
+            return
+        service = build('drive', 'v3', credentials=credentials,
+                        cache_discovery=False)
+        if remote_file is not None:
+            update_file_content(service, remote_file['id'], file_name)
+        else:
+            create_readable_file(service, file_name)
+    except HttpError as ex:
+        logging.error("Uploading %s to Drive failed because %s",
+                      file_name, ex)
+
+def upload(files=FILES):
     credentials = service_account.Credentials.from_service_account_file(
         SERVICE_ACCOUNT_FILE, scopes=SCOPES)
     try:
         service = build('drive', 'v3', credentials=credentials,
                         cache_discovery=False)
-        remote_files = get_files(service)
-        for file in FILES:
-            for remote_file in remote_files:
-                if remote_file['name'] == file:
-                    update_file_content(service, remote_file['id'], file)
-                    break
-            else:
-                create_readable_file(service, file)
+        remote_files = {}
+        for remote_file in get_files(service):
+            remote_files.setdefault(remote_file['name'], remote_file)
     except HttpError as ex:
         logging.error("Uploading to Drive failed because %s", ex)
+        return
+
+    if GZIP:
+        files = tuple(gzip_file(file) for file in files)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        uploads = [executor.submit(upload_file, credentials, file,
+                                   remote_files.get(file))
+                   for file in files]
+        for uploaded in uploads:
+            uploaded.result()
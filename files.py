@@ -0,0 +1,12 @@
+import os
+
+# Content is written next to its destination and moved into place, so
+# readers never see a partially written file.
+def write_atomically(path, content):
+    if isinstance(content, bytes):
+        file = open(path + '.tmp', 'wb')
+    else:
+        file = open(path + '.tmp', 'w', encoding='utf8')
+    with file:
+        file.write(content)
+    os.replace(path + '.tmp', path)
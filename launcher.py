@@ -0,0 +1,35 @@
+import os
+import logging
+import multiprocessing
+import segments_downloader
+from updater import configure_logging
+from db import DB
+
+PROCESSES = os.cpu_count()
+
+def download_shard(processes):
+    database = DB()
+    try:
+        segments_downloader.download(database, processes)
+    except Exception:
+        logging.exception("Unexpected exception")
+    finally:
+        database.close()
+
+def download(processes=PROCESSES):
+    shards = [multiprocessing.Process(target=download_shard, args=(processes,))
+              for _ in range(processes)]
+    for shard in shards:
+        shard.start()
+    for shard in shards:
+        shard.join()
+        if shard.exitcode:
+            logging.error("Segment downloader %i exited with %i",
+                          shard.pid, shard.exitcode)
+
+def main():
+    configure_logging()
+    download()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import logging
+from files import write_atomically
+
+CACHE_DIR = 'manifest_cache'
+CACHE_TTL = 24*60*60
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Every video has a .json entry with its video references and the ETag of
+# its manifest, and a .mpd file with the raw manifest once it was fetched.
+def entry_path(svtplay_id, extension):
+    return os.path.join(CACHE_DIR, f'{svtplay_id}.{extension}')
+
+def fresh(path, ttl):
+    return ttl is None or time.time() - os.path.getmtime(path) < ttl
+
+def load(svtplay_id, ttl=CACHE_TTL):
+    try:
+        if not fresh(entry_path(svtplay_id, 'json'), ttl):
+            return None
+        with open(entry_path(svtplay_id, 'json'), encoding='utf8') as file:
+            entry = json.load(file)
+        entry['manifest'] = None
+        if entry['has_manifest']:
+            with open(entry_path(svtplay_id, 'mpd'), 'rb') as file:
+                entry['manifest'] = file.read()
+        return entry
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as ex:
+        logging.warning("Ignoring unreadable cache entry for %s: %s",
+                        svtplay_id, ex)
+        return None
+
+def save(svtplay_id, video, manifest=None, etag=None):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        if manifest is not None:
+            write_atomically(entry_path(svtplay_id, 'mpd'), manifest)
+        write_atomically(entry_path(svtplay_id, 'json'), json.dumps({
+            'video': video,
+            'etag': etag,
+            'has_manifest': manifest is not None
+            }))
+    except OSError as ex:
+        logging.warning("Caching %s failed because %s", svtplay_id, ex)
+
+def discard(svtplay_id):
+    for extension in ('json', 'mpd'):
+        try:
+            os.remove(entry_path(svtplay_id, extension))
+        except FileNotFoundError:
+            pass
+
+def entries(ttl=None):
+    try:
+        names = sorted(os.listdir(CACHE_DIR))
+    except FileNotFoundError:
+        return
+    for name in names:
+        svtplay_id, extension = os.path.splitext(name)
+        if extension == '.json':
+            entry = load(svtplay_id, ttl)
+            if entry is not None:
+                yield svtplay_id, entry
+
+def evict(ttl=CACHE_TTL, max_bytes=MAX_CACHE_BYTES):
+    try:
+        names = os.listdir(CACHE_DIR)
+    except FileNotFoundError:
+        return
+    cached = {}
+    for name in names:
+        path = os.path.join(CACHE_DIR, name)
+        svtplay_id = name.split('.', 1)[0]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        modified, size = cached.get(svtplay_id, (0.0, 0))
+        cached[svtplay_id] = (max(modified, stat.st_mtime),
+                              size + stat.st_size)
+
+    total = sum(size for _, size in cached.values())
+    evicted = 0
+    for svtplay_id, (modified, size) in sorted(cached.items(),
+                                               key=lambda item: item[1][0]):
+        if time.time() - modified < ttl and total <= max_bytes:
+            break
+        discard(svtplay_id)
+        total -= size
+        evicted += 1
+    if evicted:
+        logging.info("Evicted %i videos from the manifest cache, %i B left",
+                     evicted, total)
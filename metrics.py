@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import logging
+import cProfile
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from files import write_atomically
+
+SUMMARY_FILE = 'run_summary.json'
+PROMETHEUS_FILE = 'updater.prom'
+PREFIX = 'updater_'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0, 60.0, 300.0)
+# Set to 'cprofile' or 'yappi' to profile the segment download event loop.
+PROFILER = os.environ.get('UPDATER_PROFILER')
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for upper, count in zip(BUCKETS + (float('inf'),), self.counts):
+            total += count
+            yield upper, total
+
+started_at = datetime.now()
+stages = defaultdict(float)
+counters = Counter()
+histograms = defaultdict(Histogram)
+videos = []
+
+def key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def increment(name, value=1, **labels):
+    counters[key(name, labels)] += value
+
+def observe(name, value, **labels):
+    histograms[key(name, labels)].observe(value)
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] += time.perf_counter() - start
+
+def record_video(svtplay_id, seconds, outcome):
+    videos.append({'id': svtplay_id, 'seconds': round(seconds, 3),
+                   'outcome': outcome})
+    observe('video_seconds', seconds, outcome=outcome)
+
+def count_retry(details):
+    increment('retries_total', function=details['target'].__name__,
+              exception=type(details.get('exception')).__name__)
+
+@contextmanager
+def profile(name):
+    if PROFILER == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f'{name}.prof')
+    elif PROFILER == 'yappi':
+        import yappi
+        yappi.set_clock_type('wall')
+        yappi.start()
+        try:
+            yield
+        finally:
+            yappi.stop()
+            yappi.get_func_stats().save(f'{name}.pstat', type='pstat')
+            yappi.clear_stats()
+    else:
+        yield
+
+def summary():
+    stored = sum(value for (name, _), value in counters.items()
+                 if name == 'stored_rows_total')
+    store_seconds = sum(histogram.sum for (name, _), histogram
+                        in histograms.items() if name == 'store_seconds')
+    return {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'stages': dict(stages),
+        'store_rows_per_second': stored / store_seconds
+                                 if store_seconds else None,
+        'counters': [{'name': name, 'labels': dict(labels),
+                      'value': value}
+                     for (name, labels), value in sorted(counters.items())],
+        'histograms': [{'name': name, 'labels': dict(labels),
+                        'count': histogram.count, 'sum': histogram.sum,
+                        'buckets': dict(
+                            (str(upper), count)
+                            for upper, count in histogram.cumulative())}
+                       for (name, labels), histogram
+                       in sorted(histograms.items())],
+        'videos': videos
+        }
+
+def prometheus_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+def prometheus():
+    lines = [f'# TYPE {PREFIX}stage_seconds gauge']
+    lines += [f'{PREFIX}stage_seconds{{stage="{name}"}} {seconds}'
+              for name, seconds in stages.items()]
+    lines.append(f'# TYPE {PREFIX}started_at_seconds gauge')
+    lines.append(f'{PREFIX}started_at_seconds {started_at.timestamp()}')
+
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PREFIX}{name} counter')
+        lines.append(f'{PREFIX}{name}{prometheus_labels(labels)} {value}')
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {PREFIX}{name} histogram')
+        for upper, count in histogram.cumulative():
+            bucket = '+Inf' if upper == float('inf') else upper
+            lines.append(f'{PREFIX}{name}_bucket'
+                         f'{prometheus_labels(labels, le=bucket)} {count}')
+        lines.append(f'{PREFIX}{name}_sum{prometheus_labels(labels)} '
+                     f'{histogram.sum}')
+        lines.append(f'{PREFIX}{name}_count{prometheus_labels(labels)} '
+                     f'{histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+def write(summary_file=SUMMARY_FILE, prometheus_file=PROMETHEUS_FILE):
+    try:
+        write_atomically(summary_file, json.dumps(summary(), indent=2))
+        write_atomically(prometheus_file, prometheus())
+    except OSError as ex:
+        logging.error("Writing run metrics failed because %s", ex)
@@ -0,0 +1 @@
+ALTER TABLE Videos ADD COLUMN fingerprint TEXT;
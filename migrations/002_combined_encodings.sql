@@ -0,0 +1,21 @@
+CREATE TABLE CombinedEncodings (
+    video_encoding INTEGER PRIMARY KEY
+        REFERENCES VideoEncodings ON DELETE CASCADE,
+    video CHAR(7) REFERENCES Videos ON DELETE CASCADE,
+    segment_length FLOAT NOT NULL,
+    segment_sizes INTEGER[] NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX ON CombinedEncodings (video);
+
+INSERT INTO CombinedEncodings
+(video_encoding, video, segment_length, segment_sizes)
+SELECT E1.id, E1.video, E1.segment_length,
+    COALESCE(
+        (SELECT ARRAY_AGG(COALESCE(U.v_size + U.a_size, 0) ORDER BY U.n)
+        FROM UNNEST(E1.segment_sizes, E2.segment_sizes)
+            WITH ORDINALITY AS U(v_size, a_size, n)),
+        '{}')
+FROM VideoEncodings E1
+INNER JOIN AudioEncodings E2 ON E1.video = E2.video;
@@ -0,0 +1,17 @@
+CREATE FUNCTION pg_temp.pack_sizes(sizes INTEGER[]) RETURNS BYTEA AS $$
+    SELECT COALESCE(STRING_AGG(INT4SEND(COALESCE(U.size, 0)), ''::BYTEA
+                               ORDER BY U.n), ''::BYTEA)
+    FROM UNNEST(sizes) WITH ORDINALITY AS U(size, n)
+$$ LANGUAGE SQL IMMUTABLE;
+
+ALTER TABLE VideoEncodings
+    ALTER COLUMN segment_sizes TYPE BYTEA
+    USING pg_temp.pack_sizes(segment_sizes);
+
+ALTER TABLE AudioEncodings
+    ALTER COLUMN segment_sizes TYPE BYTEA
+    USING pg_temp.pack_sizes(segment_sizes);
+
+ALTER TABLE CombinedEncodings
+    ALTER COLUMN segment_sizes TYPE BYTEA
+    USING pg_temp.pack_sizes(segment_sizes);
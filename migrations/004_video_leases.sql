@@ -0,0 +1,5 @@
+CREATE TABLE VideoLeases (
+    video CHAR(7) PRIMARY KEY REFERENCES Videos ON DELETE CASCADE,
+    owner TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
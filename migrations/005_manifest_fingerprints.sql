@@ -0,0 +1,6 @@
+ALTER TABLE Videos
+    ADD COLUMN manifest_fingerprint TEXT,
+    ADD COLUMN manifest_etag TEXT,
+    ADD COLUMN manifest_checked_at TIMESTAMP;
+ALTER TABLE VideoEncodings ADD COLUMN fingerprint TEXT;
+ALTER TABLE AudioEncodings ADD COLUMN fingerprint TEXT;
@@ -0,0 +1,2 @@
+CREATE INDEX CONCURRENTLY ON Videos (valid_to);
+CREATE INDEX CONCURRENTLY ON VideoEncodings (video);
@@ -0,0 +1,144 @@
+import json
+import hashlib
+from urllib.parse import urljoin
+from typing import NamedTuple, Optional
+from lxml import etree
+
+class SegmentTemplate(NamedTuple):
+    media: str
+    timescale: int
+    start_number: int
+    first_duration: int
+    total_duration: int
+    count: int
+    timeline: tuple
+
+    @property
+    def segment_length(self):
+        return self.first_duration / self.timescale
+
+    @property
+    def duration(self):
+        return self.total_duration / self.timescale
+
+class Representation(NamedTuple):
+    id: str
+    bandwidth: int
+    codecs: str
+    mime_type: str
+    width: Optional[int]
+    height: Optional[int]
+    sampling_rate: Optional[int]
+    segment_template: SegmentTemplate
+
+class AdaptationSet(NamedTuple):
+    content_type: str
+    role: Optional[str]
+    representations: tuple
+
+class Manifest(NamedTuple):
+    base_url: str
+    adaptation_sets: tuple
+
+def optional_int(value):
+    return None if value is None else int(value)
+
+def parse_segment_template(element):
+    timeline = element.find('{*}SegmentTimeline')
+    if timeline is None:
+        raise ValueError("SegmentTimeline not found")
+    media = element.get('media')
+    if media is None:
+        raise ValueError("SegmentTemplate has no media")
+    count, total_duration, first_duration = 0, 0, None
+    runs = []
+    for segment in timeline.iterfind('{*}S'):
+        duration = int(segment.get('d'))
+        repeats = max(int(segment.get('r', 0)), 0)
+        runs.append((optional_int(segment.get('t')), duration, repeats))
+        if first_duration is None:
+            first_duration = duration
+        count += 1 + repeats
+        total_duration += duration * (1 + repeats)
+    if first_duration is None:
+        raise ValueError("empty SegmentTimeline")
+
+    return SegmentTemplate(
+        media=media,
+        timescale=int(element.get('timescale', 1)),
+        start_number=int(element.get('startNumber', 1)),
+        first_duration=first_duration,
+        total_duration=total_duration,
+        count=count,
+        timeline=tuple(runs))
+
+def parse_representation(element, adaptation_set, inherited_template):
+    template_element = element.find('{*}SegmentTemplate')
+    if template_element is not None:
+        segment_template = parse_segment_template(template_element)
+    elif inherited_template is not None:
+        segment_template = inherited_template
+    else:
+        raise ValueError("SegmentTemplate not found")
+
+    def attribute(name):
+        return element.get(name, adaptation_set.get(name))
+
+    return Representation(
+        id=element.get('id'),
+        bandwidth=int(element.get('bandwidth')),
+        codecs=attribute('codecs'),
+        mime_type=attribute('mimeType'),
+        width=optional_int(attribute('width')),
+        height=optional_int(attribute('height')),
+        sampling_rate=optional_int(attribute('audioSamplingRate')),
+        segment_template=segment_template)
+
+def parse_adaptation_set(element):
+    template_element = element.find('{*}SegmentTemplate')
+    inherited_template = (parse_segment_template(template_element)
+                          if template_element is not None else None)
+    role = element.find('{*}Role')
+    content_type = element.get('contentType')
+    if content_type is None:
+        content_type = (element.get('mimeType') or '').partition('/')[0]
+
+    return AdaptationSet(
+        content_type=content_type,
+        role=role.get('value') if role is not None else None,
+        representations=tuple(
+            parse_representation(rep, element, inherited_template)
+            for rep in element.iterfind('{*}Representation')))
+
+def parse(manifest):
+    try:
+        root = etree.fromstring(manifest)
+    except etree.XMLSyntaxError as ex:
+        raise ValueError(f"invalid manifest: {ex}") from ex
+    base_url = root.findtext('.//{*}BaseURL')
+    if base_url is None:
+        raise ValueError("BaseURL not found")
+
+    return Manifest(
+        base_url=base_url.strip(),
+        adaptation_sets=tuple(
+            parse_adaptation_set(adaptation_set)
+            for adaptation_set in root.iterfind('.//{*}AdaptationSet')))
+
+def media_url(base_url, rep):
+    media = rep.segment_template.media
+    if '$RepresentationID$' in media:
+        if rep.id is None:
+            raise ValueError("Representation has no id")
+        media = media.replace('$RepresentationID$', rep.id)
+    media = media.replace('$Bandwidth$', str(rep.bandwidth))
+    return urljoin(base_url, media)
+
+def fingerprint(base_url, rep):
+    segment_template = rep.segment_template
+    content = json.dumps((
+        media_url(base_url, rep), segment_template.timescale,
+        segment_template.start_number, segment_template.timeline,
+        rep.bandwidth, rep.codecs, rep.mime_type, rep.width, rep.height,
+        rep.sampling_rate)).encode('utf8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
@@ -0,0 +1,44 @@
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Segment sizes are stored as big-endian int32 so that the layout matches
+# PostgreSQL's int4send, with 0 standing in for an unknown size.
+BIG_ENDIAN_INT32 = '>i4'
+
+def pack_sizes(sizes):
+    packed = array('i', (size or 0 for size in sizes))
+    if sys.byteorder == 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+def unpack_sizes(data):
+    sizes = array('i')
+    sizes.frombytes(data)
+    if sys.byteorder == 'little':
+        sizes.byteswap()
+    return sizes
+
+def combine_sizes(video_data, audio_data):
+    if numpy is not None:
+        video = numpy.frombuffer(video_data, dtype=BIG_ENDIAN_INT32)
+        audio = numpy.frombuffer(audio_data, dtype=BIG_ENDIAN_INT32)
+        common = min(len(video), len(audio))
+        combined = numpy.zeros(max(len(video), len(audio)),
+                               dtype=BIG_ENDIAN_INT32)
+        combined[:common] = numpy.where(
+            (video[:common] != 0) & (audio[:common] != 0),
+            video[:common] + audio[:common], 0)
+        return combined.tobytes()
+
+    video = unpack_sizes(video_data)
+    audio = unpack_sizes(audio_data)
+    combined = array('i', (video_size + audio_size
+                           if video_size and audio_size else 0
+                           for video_size, audio_size in zip(video, audio)))
+    combined.extend([0] * abs(len(video) - len(audio)))
+    return pack_sizes(combined)
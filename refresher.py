@@ -0,0 +1,18 @@
+import logging
+import segments_downloader
+from updater import configure_logging
+from db import DB
+
+def main():
+    configure_logging()
+
+    database = DB()
+    try:
+        segments_downloader.download(database, refresh=True)
+    except Exception:
+        logging.exception("Unexpected exception")
+    finally:
+        database.close()
+
+if __name__ == "__main__":
+    main()
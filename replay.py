@@ -0,0 +1,12 @@
+import logging
+import segments_downloader
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        level=logging.INFO)
+    segments_downloader.replay()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+# Seconds of programme content measured per second by one process's
+# worker pool, used until the first videos of a run have been measured.
+ESTIMATED_THROUGHPUT = 200.0
+# Jobs are only deferred once this many videos have been measured.
+MIN_SAMPLES = 10
+
+class Job(NamedTuple):
+    id: str
+    duration: int
+    valid_from: Optional[datetime]
+    valid_to: Optional[datetime]
+
+def earliest_expiry(job):
+    return (job.valid_to or datetime.max, job.duration)
+
+def shortest_job(job):
+    return (job.duration, job.valid_to or datetime.max)
+
+def newest(job):
+    return (datetime.max - (job.valid_from or datetime.min), job.duration)
+
+class Policy(NamedTuple):
+    key: Callable
+    order_by: str
+
+# Every policy orders jobs in Python and, for claiming from the shared
+# backlog, in SQL over the Videos table aliased as V.
+POLICIES = {
+    'earliest_expiry': Policy(
+        earliest_expiry, 'V.valid_to ASC NULLS LAST, V.duration'),
+    'shortest_job': Policy(
+        shortest_job, 'V.duration, V.valid_to ASC NULLS LAST'),
+    'newest': Policy(
+        newest, 'V.valid_from DESC NULLS LAST, V.duration')
+    }
+
+class Schedule:
+    def __init__(self, policy, budget, workers,
+                 throughput=ESTIMATED_THROUGHPUT):
+        self.policy = policy
+        self.budget = budget
+        self.deadline = time.time() + budget
+        self.claimed = 0
+        self.predicted = 0
+        self.completed = 0
+        self.deferred = 0
+        self.abandoned = deque()
+        self._throughput = throughput
+        self._predicted_seconds = 0.0
+        self._content_seconds = throughput / workers
+        self._wall_seconds = 1.0
+
+    def claim(self, rows):
+        # Coverage is predicted over this process's own claims, which the
+        # shared backlog hands out in policy order.
+        jobs = self.order(rows)
+        for job in jobs:
+            self.claimed += 1
+            self._predicted_seconds += job.duration / self._throughput
+            if self._predicted_seconds <= self.budget:
+                self.predicted += 1
+        return jobs
+
+    def order(self, rows):
+        return sorted(map(Job._make, rows), key=POLICIES[self.policy].key)
+
+    def expired(self):
+        return time.time() > self.deadline
+
+    def admit(self, job):
+        if self.expired():
+            return False
+        if (self.completed >= MIN_SAMPLES
+                and self.estimate(job) > self.deadline - time.time()):
+            self.deferred += 1
+            return False
+        return True
+
+    def abandon(self, job):
+        # Deferred and failed videos are handed back to the shared backlog
+        # while the run goes on, so idle processes never wait on them.
+        self.abandoned.append(job.id)
+
+    def estimate(self, job):
+        return job.duration * self._wall_seconds / self._content_seconds
+
+    def done(self, job, elapsed):
+        self.completed += 1
+        self._content_seconds += job.duration
+        self._wall_seconds += elapsed
+
+    def report(self):
+        logging.info("Claimed %i videos by %s - predicted to measure %i, "
+                     "measured %i, deferred %i (%.1f content s/s per video)",
+                     self.claimed, self.policy, self.predicted,
+                     self.completed, self.deferred,
+                     self._content_seconds / self._wall_seconds)
@@ -9,9 +9,15 @@ CREATE TABLE Videos (
     short_description TEXT,
     long_description TEXT,
     production_year INTEGER,
+    fingerprint TEXT,
+    manifest_fingerprint TEXT,
+    manifest_etag TEXT,
+    manifest_checked_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX ON Videos (valid_to);
+
 CREATE TABLE VideoEncodings (
     id SERIAL PRIMARY KEY,
     video CHAR(7) REFERENCES Videos ON DELETE CASCADE,
@@ -21,10 +27,13 @@ CREATE TABLE VideoEncodings (
     width INTEGER NOT NULL,
     height INTEGER NOT NULL,
     segment_length FLOAT NOT NULL,
-    segment_sizes INTEGER[] NOT NULL,
+    segment_sizes BYTEA NOT NULL,
+    fingerprint TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX ON VideoEncodings (video);
+
 CREATE TABLE AudioEncodings (
     id SERIAL PRIMARY KEY,
     video CHAR(7) UNIQUE REFERENCES Videos ON DELETE CASCADE,
@@ -33,10 +42,28 @@ CREATE TABLE AudioEncodings (
     mime_type TEXT NOT NULL,
     sampling_rate INTEGER NOT NULL,
     segment_length FLOAT NOT NULL,
-    segment_sizes INTEGER[] NOT NULL,
+    segment_sizes BYTEA NOT NULL,
+    fingerprint TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE CombinedEncodings (
+    video_encoding INTEGER PRIMARY KEY
+        REFERENCES VideoEncodings ON DELETE CASCADE,
+    video CHAR(7) REFERENCES Videos ON DELETE CASCADE,
+    segment_length FLOAT NOT NULL,
+    segment_sizes BYTEA NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX ON CombinedEncodings (video);
+
+CREATE TABLE VideoLeases (
+    video CHAR(7) PRIMARY KEY REFERENCES Videos ON DELETE CASCADE,
+    owner TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
 CREATE TABLE Genres (
     id TEXT PRIMARY KEY,
     name TEXT,
@@ -0,0 +1,144 @@
+import mmap
+import struct
+from typing import NamedTuple
+from packing import unpack_sizes
+
+# Layout, all big-endian:
+#   header   magic, video count, encoding count and section offsets
+#   sizes    packed int32 segment sizes of every encoding, back to back
+#   encodings (offset, segment count, segment length) per encoding, grouped
+#            per video
+#   videos   one fixed-size entry per video, sorted by id for binary search
+#   names    utf8 video names referenced by the video entries
+MAGIC = b'SVTSEG\x00\x02'
+HEADER = struct.Struct('>8sIIQQQ')
+ENCODING = struct.Struct('>QId')
+VIDEO = struct.Struct('>7s?IIIQI')
+
+class Encoding(NamedTuple):
+    segment_length: float
+    segment_sizes: tuple
+
+class Video(NamedTuple):
+    id: str
+    name: str
+    duration: int
+    sweden_only: bool
+    encodings: tuple
+
+class SegmentFileWriter:
+    def __init__(self, file_name):
+        self._file = open(file_name, 'wb')
+        self._file.write(b'\x00' * HEADER.size)
+        self._videos = {}
+        self._names = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def add(self, svtplay_id, name, duration, segment_length, sweden_only,
+            segment_sizes):
+        key = svtplay_id.encode('ascii')
+        if key not in self._videos:
+            encoded_name = name.encode('utf8')
+            self._videos[key] = (sweden_only, duration, len(self._names),
+                                 len(encoded_name), [])
+            self._names += encoded_name
+        encodings = self._videos[key][-1]
+        for sizes in segment_sizes:
+            encodings.append((self._file.tell(), len(sizes) // 4,
+                              segment_length))
+            self._file.write(sizes)
+
+    def close(self):
+        encodings_offset = self._file.tell()
+        entries = []
+        encoding_count = 0
+        for key, (sweden_only, duration, name_offset, name_length,
+                  encodings) in sorted(self._videos.items()):
+            entries.append((key, sweden_only, duration, encoding_count,
+                            len(encodings), name_offset, name_length))
+            for encoding in encodings:
+                self._file.write(ENCODING.pack(*encoding))
+            encoding_count += len(encodings)
+        videos_offset = self._file.tell()
+        for entry in entries:
+            self._file.write(VIDEO.pack(*entry))
+        names_offset = self._file.tell()
+        self._file.write(self._names)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(
+            MAGIC, len(entries), encoding_count, encodings_offset,
+            videos_offset, names_offset))
+        self._file.close()
+
+class SegmentFile:
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._video_count, _, self._encodings_offset,
+         self._videos_offset, self._names_offset) = HEADER.unpack_from(
+             self._data)
+        if magic != MAGIC:
+            raise ValueError(f"{file_name} is not a segment file")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._video_count
+
+    def __iter__(self):
+        for index in range(self._video_count):
+            yield self._video(index)
+
+    def __getitem__(self, svtplay_id):
+        key = svtplay_id.encode('ascii')
+        low, high = 0, self._video_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_id = self._data[self._video_offset(middle):
+                                  self._video_offset(middle) + 7]
+            if entry_id < key:
+                low = middle + 1
+            elif entry_id > key:
+                high = middle
+            else:
+                return self._video(middle)
+        raise KeyError(svtplay_id)
+
+    def close(self):
+        self._data.close()
+
+    def _video_offset(self, index):
+        return self._videos_offset + index * VIDEO.size
+
+    def _video(self, index):
+        (svtplay_id, sweden_only, duration, first_encoding, encoding_count,
+         name_offset, name_length) = VIDEO.unpack_from(
+             self._data, self._video_offset(index))
+        name_start = self._names_offset + name_offset
+        encodings = []
+        for encoding in range(first_encoding, first_encoding + encoding_count):
+            offset, segments, segment_length = ENCODING.unpack_from(
+                self._data, self._encodings_offset + encoding * ENCODING.size)
+            encodings.append(Encoding(
+                segment_length=segment_length,
+                segment_sizes=unpack_sizes(
+                    self._data[offset:offset + segments * 4])))
+        return Video(
+            id=svtplay_id.decode('ascii'),
+            name=self._data[name_start:name_start + name_length].decode(
+                'utf8'),
+            duration=duration,
+            sweden_only=sweden_only,
+            encodings=tuple(encodings))
@@ -1,13 +1,36 @@
-from urllib.parse import urljoin
+import os
+import socket
 import time
+import hashlib
 import logging
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import Counter, deque
 import aiohttp
 import backoff
-from bs4 import BeautifulSoup
+import mpd
+import metrics
+from concurrency import AdaptiveLimiter, FailFastError
+import checkpoints
+import manifest_cache
+from scheduler import Schedule
+from packing import pack_sizes
 
 TIMEOUT = 60*60*5
-SEMAPHORE_COUNTER = 100
+REFRESH_TIMEOUT = 60*60
+REFRESH_SECONDS = 7*24*60*60
+MIN_CONCURRENCY = 10
+INITIAL_CONCURRENCY = 100
+MAX_CONCURRENCY = 400
+KEEPALIVE_TIMEOUT = 30
+WORKERS = 10
+SCHEDULING_POLICY = 'earliest_expiry'
+CLAIM_BATCH = WORKERS
+CLAIM_INTERVAL = 30
+LEASE_SECONDS = 10*60
+WRITE_BATCH = 10
+WRITE_QUEUE_SIZE = 20
 API_URL = 'https://api.svt.se'
 HEADERS = {
     'user-agent': ("Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) "
@@ -20,6 +43,10 @@ DASH_PRIORITY = (
     'dash-avc-51', 'dash-hevc', 'dash-hbbtv-hevc', 'dash-hb-hevc',
     'dash-lb-hevc', 'dash-hevc-51', 'dash-hbbtv-hevc-51', 'dash-hb-hevc-51'
     )
+REQUIRED_ATTRIBUTES = {
+    'video': ('codecs', 'mime_type', 'width', 'height'),
+    'audio': ('codecs', 'mime_type', 'sampling_rate')
+    }
 
 def fatal_code(ex):
     return 400 <= ex.status < 500
@@ -27,13 +54,14 @@ def fatal_code(ex):
 def retry(function):
     function = backoff.on_exception(
         backoff.expo, aiohttp.ClientResponseError,
-        max_time=60, giveup=fatal_code, logger=None)(function)
+        max_time=60, giveup=fatal_code, logger=None,
+        on_backoff=metrics.count_retry)(function)
     function = backoff.on_exception(
         backoff.expo, aiohttp.ClientConnectionError,
-        max_time=60, logger=None)(function)
+        max_time=60, logger=None, on_backoff=metrics.count_retry)(function)
     function = backoff.on_exception(
         backoff.expo, asyncio.TimeoutError,
-        max_time=300, logger=None)(function)
+        max_time=300, logger=None, on_backoff=metrics.count_retry)(function)
     return function
 
 def manifest_url(video_refs):
@@ -43,134 +71,484 @@ def manifest_url(video_refs):
                 return ref['url'] + '&excludeCodecs=hvc&excludeCodecs=ac-3'
     raise ValueError("DASH format not found")
 
-def n_segments(segment_timeline):
-    segments = 0
-    for segment in segment_timeline.find_all('s'):
-        segments += 1
-        subsequent_segments = segment.get('r')
-        if subsequent_segments is None:
-            continue
-        for _ in range(int(subsequent_segments)):
-            segments += 1
-    return segments
-
 @retry
-async def fetch(session, url):
-    async with session.get(url) as resp:
-        return await resp.read()
+async def fetch_manifest(session, url, limiter, etag=None):
+    headers = {'If-None-Match': etag} if etag else None
+    async with limiter.request(url):
+        with metrics.timer('request_seconds', endpoint='manifest'):
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 304:
+                    return None, etag
+                return await resp.read(), resp.headers.get('ETag')
 
 @retry
-async def fetch_json(session, url):
-    async with session.get(url) as resp:
-        return await resp.json()
+async def fetch_json(session, url, limiter):
+    async with limiter.request(url):
+        with metrics.timer('request_seconds', endpoint='video'):
+            async with session.get(url) as resp:
+                return await resp.json()
 
 @retry
-async def fetch_content_length(session, url, semaphore):
-    async with semaphore:
-        async with session.head(url, headers=HEADERS, timeout=10) as resp:
-            return resp.content_length
-
-async def dash_manifest(session, svtplay_id):
-    video_data = await fetch_json(session, f'{API_URL}/video/{svtplay_id}')
-    url = (f'{API_URL}/ditto/api/V1/web?manifestUrl='
-           + manifest_url(video_data['videoReferences']))
-    return await fetch(session, url)
-
-async def download_encoding(session, base_url, rep, content_type):
-    segment_template = rep.find('segmenttemplate')
-    segment_timeline = segment_template.find('segmenttimeline')
-    segment_length = (int(segment_timeline.find('s')['d'])
-                      / int(segment_template['timescale']))
-    media_path = segment_template['media'].replace('$Number$', '{}')
-    url = urljoin(base_url, media_path)
-
-    sem = asyncio.Semaphore(SEMAPHORE_COUNTER)
-    tasks = [asyncio.create_task(
-        fetch_content_length(session, url.format(i+1), sem)
-        ) for i in range(n_segments(segment_timeline))]
-
-    segment_sizes = await asyncio.gather(*tasks, return_exceptions=True)
-    for result in segment_sizes:
+async def fetch_content_length(session, url, limiter):
+    async with limiter.request(url):
+        with metrics.timer('request_seconds', endpoint='segment'):
+            async with session.head(url, headers=HEADERS,
+                                    timeout=10) as resp:
+                return resp.content_length
+
+def ditto_url(video_data):
+    return (f'{API_URL}/ditto/api/V1/web?manifestUrl='
+            + manifest_url(video_data['videoReferences']))
+
+async def dash_manifest(session, svtplay_id, limiter, etag=None,
+                        revalidate=False):
+    cached = manifest_cache.load(svtplay_id)
+    if cached is None:
+        video_data = await fetch_json(
+            session, f'{API_URL}/video/{svtplay_id}', limiter)
+        manifest_cache.save(svtplay_id, video_data)
+    else:
+        video_data = cached['video']
+        if cached['manifest'] is not None and not revalidate:
+            metrics.increment('manifest_cache_total', outcome='hit')
+            return cached['manifest'], cached['etag']
+    metrics.increment('manifest_cache_total', outcome='miss')
+    manifest, etag = await fetch_manifest(
+        session, ditto_url(video_data), limiter, etag)
+    if manifest is not None:
+        manifest_cache.save(svtplay_id, video_data, manifest, etag)
+    return manifest, etag
+
+def manifest_fingerprint(fingerprints):
+    content = ','.join(sorted(fingerprints)).encode('utf8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+async def measure_segment(session, url, limiter, segment_sizes, index):
+    content_length = await fetch_content_length(session, url, limiter)
+    segment_sizes[index] = content_length or 0
+
+def plan_encoding(base_url, rep, progress):
+    segment_template = rep.segment_template
+    url = mpd.media_url(base_url, rep).replace('$Number$', '{}')
+
+    segment_sizes = progress.get(url)
+    if segment_sizes is None or len(segment_sizes) != segment_template.count:
+        segment_sizes = progress[url] = [None] * segment_template.count
+    return url, segment_sizes
+
+async def download_encoding(session, base_url, rep, content_type, limiter,
+                            progress):
+    segment_template = rep.segment_template
+    url, segment_sizes = plan_encoding(base_url, rep, progress)
+
+    tasks = [asyncio.create_task(measure_segment(
+        session, url.format(segment_template.start_number + i), limiter,
+        segment_sizes, i)
+        ) for i, size in enumerate(segment_sizes) if size is None]
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
         if isinstance(result, Exception):
             return result
 
     encoding = {
-        'bandwidth': rep['bandwidth'],
-        'codecs': rep['codecs'],
-        'mime_type': rep['mimetype'],
-        'segment_length': segment_length,
-        'segment_sizes': segment_sizes
+        'bandwidth': rep.bandwidth,
+        'codecs': rep.codecs,
+        'mime_type': rep.mime_type,
+        'segment_length': segment_template.segment_length,
+        'segment_sizes': pack_sizes(segment_sizes),
+        'fingerprint': mpd.fingerprint(base_url, rep)
         }
 
     if content_type == 'audio':
-        encoding['sampling_rate'] = rep['audiosamplingrate']
+        encoding['sampling_rate'] = rep.sampling_rate
     else:
-        encoding['width'] = rep['width']
-        encoding['height'] = rep['height']
+        encoding['width'] = rep.width
+        encoding['height'] = rep.height
 
     return encoding
 
-async def download_encodings(session, svtplay_id):
-    manifest = await dash_manifest(session, svtplay_id)
-    soup = BeautifulSoup(manifest.decode('utf8'), 'lxml')
-    base_url = soup.find('baseurl').text
-    if soup.find('segmenttemplate')['media'].startswith('chunk-stream'):
+def check_attributes(rep, content_type):
+    missing = [name for name in REQUIRED_ATTRIBUTES[content_type]
+               if getattr(rep, name) is None]
+    if missing:
+        raise ValueError(f"{content_type} representation {rep.id} is "
+                         f"missing {', '.join(missing)}")
+
+def select_representations(manifest):
+    if any(rep.segment_template.media.startswith('chunk-stream')
+           for adaptation_set in manifest.adaptation_sets
+           for rep in adaptation_set.representations):
         raise ValueError("wrong manifest schema")
 
-    video_tasks = []
-    for adaptation_set in soup.find_all('adaptationset'):
-        content_type = adaptation_set['contenttype']
-        if content_type == 'video':
-            for rep in adaptation_set.find_all('representation'):
-                video_tasks.append(asyncio.create_task(
-                    download_encoding(session, base_url, rep, content_type)))
-        elif content_type == 'audio':
-            if adaptation_set.find('role')['value'] == 'main':
-                rep = adaptation_set.find('representation')
-                audio_task = asyncio.create_task(
-                    download_encoding(session, base_url, rep, content_type))
-
-    video_result = await asyncio.gather(*video_tasks, return_exceptions=True)
-    audio_result = await audio_task
-    for result in video_result:
-        if isinstance(result, Exception):
-            raise result
-    if isinstance(audio_result, Exception):
-        raise audio_result
+    video_reps = [rep for adaptation_set in manifest.adaptation_sets
+                  if adaptation_set.content_type == 'video'
+                  for rep in adaptation_set.representations]
+    audio_rep = next((adaptation_set.representations[0]
+                      for adaptation_set in manifest.adaptation_sets
+                      if adaptation_set.content_type == 'audio'
+                      and adaptation_set.role == 'main'
+                      and adaptation_set.representations), None)
+    if audio_rep is None:
+        raise ValueError("main audio not found")
+    for rep in video_reps:
+        check_attributes(rep, 'video')
+    check_attributes(audio_rep, 'audio')
+    return video_reps, audio_rep
+
+async def measure_representations(session, svtplay_id, base_url, video_reps,
+                                  audio_rep, limiter):
+    progress = checkpoints.load(svtplay_id)
+    video_tasks = [asyncio.create_task(
+        download_encoding(session, base_url, rep, 'video', limiter,
+                          progress)
+        ) for rep in video_reps]
+    audio_task = (asyncio.create_task(
+        download_encoding(session, base_url, audio_rep, 'audio', limiter,
+                          progress))
+        if audio_rep is not None else None)
+
+    try:
+        video_result = await asyncio.gather(*video_tasks,
+                                            return_exceptions=True)
+        audio_result = await audio_task if audio_task is not None else None
+        for result in video_result:
+            if isinstance(result, Exception):
+                raise result
+        if isinstance(audio_result, Exception):
+            raise audio_result
+    except (Exception, asyncio.CancelledError):
+        checkpoints.save(svtplay_id, progress)
+        raise
+
+    return video_result, audio_result
+
+async def download_encodings(session, svtplay_id, limiter):
+    body, etag = await dash_manifest(session, svtplay_id, limiter)
+    manifest = mpd.parse(body)
+    video_reps, audio_rep = select_representations(manifest)
+    video_result, audio_result = await measure_representations(
+        session, svtplay_id, manifest.base_url, video_reps, audio_rep,
+        limiter)
 
     return {
         'id': svtplay_id,
+        'manifest_fingerprint': manifest_fingerprint(
+            mpd.fingerprint(manifest.base_url, rep)
+            for rep in video_reps + [audio_rep]),
+        'manifest_etag': etag,
         'videos': video_result,
         'audio': audio_result
         }
 
-async def run(database):
-    timeout = time.time() + TIMEOUT
-    svtplay_ids = database.not_downloaded()
-    connector = aiohttp.TCPConnector(force_close=True)
-    async with aiohttp.ClientSession(
-            connector=connector, raise_for_status=True) as session:
-        logging.info("Downloading segments for %i videos", len(svtplay_ids))
-        for svtplay_id in svtplay_ids:
-            if time.time() > timeout:
+def stored_encoding(encodings, rep, rep_fingerprint):
+    for encoding in encodings:
+        if encoding['fingerprint'] == rep_fingerprint:
+            break
+    else:
+        # Encodings stored before fingerprinting are matched on what the
+        # database knows about them, so the first refresh does not
+        # re-measure every video.
+        for encoding in encodings:
+            if (encoding['fingerprint'] is None
+                    and encoding['bandwidth'] == rep.bandwidth
+                    and encoding['codecs'] == rep.codecs
+                    and encoding['count'] == rep.segment_template.count
+                    and encoding['segment_length']
+                    == rep.segment_template.segment_length):
                 break
-            msg = f"Downloading {svtplay_id} "
+        else:
+            return None
+    encodings.remove(encoding)
+    return encoding
+
+async def refresh_encodings(session, svtplay_id, stored, limiter):
+    body, etag = await dash_manifest(session, svtplay_id, limiter,
+                                     stored['manifest_etag'], revalidate=True)
+    refreshed = {
+        'id': svtplay_id,
+        'manifest_fingerprint': stored['manifest_fingerprint'],
+        'manifest_etag': etag,
+        'keep': None
+        }
+    if body is None:
+        metrics.increment('manifests_total', outcome='not_modified')
+        return refreshed
+
+    manifest = mpd.parse(body)
+    video_reps, audio_rep = select_representations(manifest)
+    fingerprints = [mpd.fingerprint(manifest.base_url, rep)
+                    for rep in video_reps + [audio_rep]]
+    refreshed['manifest_fingerprint'] = manifest_fingerprint(fingerprints)
+    if refreshed['manifest_fingerprint'] == stored['manifest_fingerprint']:
+        metrics.increment('manifests_total', outcome='unchanged')
+        return refreshed
+
+    keep, changed_reps = [], []
+    for rep, rep_fingerprint in zip(video_reps, fingerprints):
+        encoding = stored_encoding(stored['videos'], rep, rep_fingerprint)
+        if encoding is None:
+            changed_reps.append(rep)
+        else:
+            keep.append((encoding['id'], rep_fingerprint))
+    audio_fingerprint = fingerprints[-1]
+    if stored_encoding(stored['audio'], audio_rep,
+                       audio_fingerprint) is not None:
+        audio_rep = None
+
+    video_result, audio_result = await measure_representations(
+        session, svtplay_id, manifest.base_url, changed_reps, audio_rep,
+        limiter)
+    metrics.increment('manifests_total', outcome='changed')
+    metrics.increment('remeasured_encodings_total',
+                      len(changed_reps) + (audio_rep is not None))
+    refreshed.update(keep=keep, videos=video_result, audio=audio_result,
+                     audio_fingerprint=audio_fingerprint)
+    return refreshed
+
+async def download_video(session, svtplay_id, limiter, queue, stored=None):
+    msg = f"Downloading {svtplay_id} "
+    try:
+        if stored is None:
+            video_encodings = await download_encodings(
+                session, svtplay_id, limiter)
+        else:
+            video_encodings = await refresh_encodings(
+                session, svtplay_id, stored, limiter)
+        await queue.put(video_encodings)
+        return True
+    except (KeyError, ValueError, TypeError) as ex:
+        msg += f"failed because {ex}"
+        logging.warning(msg)
+    except aiohttp.ClientResponseError as ex:
+        msg += (f"failed with {ex.status} on {ex.request_info.url} - "
+                "exhausted retries")
+        logging.warning(msg)
+        if fatal_code(ex):
+            manifest_cache.discard(svtplay_id)
+    except aiohttp.ClientConnectionError as ex:
+        msg += f"failed with {ex} - exhausted retries"
+        logging.warning(msg)
+    except asyncio.TimeoutError:
+        msg += "timed out - exhausted retries"
+        logging.warning(msg)
+    return False
+
+async def worker(session, jobs, taken, schedule, limiter, queue, parked):
+    while (item := await jobs.get()) is not None:
+        taken.set()
+        try:
+            await run_job(session, item, schedule, limiter, queue, parked)
+        finally:
+            jobs.task_done()
+
+async def run_job(session, item, schedule, limiter, queue, parked):
+    job, stored = item
+    await limiter.available()
+    if not schedule.admit(job):
+        schedule.abandon(job)
+        return
+    start = time.time()
+    try:
+        downloaded = await download_video(session, job.id, limiter, queue,
+                                          stored)
+    except FailFastError as ex:
+        logging.warning("Parked %s because %s", job.id, ex)
+        metrics.record_video(job.id, time.time() - start, 'parked')
+        parked.append(item)
+        return
+    elapsed = time.time() - start
+    metrics.record_video(job.id, elapsed,
+                         'measured' if downloaded else 'failed')
+    if downloaded:
+        schedule.done(job, elapsed)
+    else:
+        schedule.abandon(job)
+
+async def claim_jobs(database, executor, owner, schedule, jobs, taken,
+                     refresh, limiter, parked):
+    loop = asyncio.get_running_loop()
+    refresh_seconds = REFRESH_SECONDS if refresh else None
+    released = set()
+    while not schedule.expired():
+        while parked:
+            await jobs.put(parked.popleft())
+        # Only claim what the workers can take up next, so other processes
+        # get their share of the backlog.
+        while jobs.full():
+            taken.clear()
+            await taken.wait()
+        try:
+            abandoned = []
+            while schedule.abandoned:
+                abandoned.append(schedule.abandoned.popleft())
+            if abandoned:
+                await loop.run_in_executor(executor, partial(
+                    database.release, owner, abandoned))
+                released.update(abandoned)
+            rows = await loop.run_in_executor(executor, partial(
+                database.claim, owner, jobs.maxsize - jobs.qsize(),
+                LEASE_SECONDS, SCHEDULING_POLICY, refresh_seconds,
+                released))
+            stored = (await loop.run_in_executor(executor, partial(
+                database.stored_manifests, [row[0] for row in rows]))
+                if refresh and rows else {})
+        except Exception:
+            logging.exception("Claiming videos failed")
+            break
+        if not rows:
+            # Jobs still running may park their videos, which are retried
+            # once the host recovers until the schedule runs out.
+            await jobs.join()
+            if parked:
+                await limiter.available()
+                continue
+            # Videos leased by other processes come back when those give
+            # up on them or stall, so keep claiming while any are out.
             try:
-                video_encodings = await download_encodings(session, svtplay_id)
-                database.store(video_encodings=video_encodings)
-            except (KeyError, ValueError, TypeError) as ex:
-                msg += f"failed because {ex}"
-                logging.warning(msg)
-            except aiohttp.ClientResponseError as ex:
-                msg += (f"failed with {ex.status} on {ex.request_info.url} - "
-                        "exhausted retries")
-                logging.warning(msg)
-            except aiohttp.ClientConnectionError as ex:
-                msg += f"failed with {ex} - exhausted retries"
-                logging.warning(msg)
-            except asyncio.TimeoutError:
-                msg += "timed out - exhausted retries"
-                logging.warning(msg)
-
-def download(database):
-    asyncio.run(run(database))
+                leased = await loop.run_in_executor(executor, partial(
+                    database.leased_elsewhere, owner, refresh_seconds))
+            except Exception:
+                logging.exception("Counting leased videos failed")
+                break
+            if not leased:
+                break
+            await asyncio.sleep(min(CLAIM_INTERVAL,
+                                    max(schedule.deadline - time.time(), 0)))
+            continue
+        for job in schedule.claim(rows):
+            await jobs.put((job, stored.get(job.id)))
+    for _ in range(WORKERS):
+        await jobs.put(None)
+
+async def renew_leases(database, executor, owner):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        try:
+            await loop.run_in_executor(executor, partial(
+                database.heartbeat, owner, LEASE_SECONDS))
+        except Exception:
+            logging.exception("Renewing leases failed")
+
+async def write_behind(database, queue, executor, kind):
+    done = False
+    while not done:
+        batch = [await queue.get()]
+        while len(batch) < WRITE_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch[-1] is None:
+            batch.pop()
+            done = True
+        if not batch:
+            continue
+        try:
+            await store(database, executor, kind, batch)
+        except Exception:
+            logging.exception("Storing %i videos failed, storing them one "
+                              "at a time", len(batch))
+            for video_encodings in batch:
+                try:
+                    await store(database, executor, kind, [video_encodings])
+                except Exception:
+                    logging.exception("Storing %s failed",
+                                      video_encodings['id'])
+                    metrics.increment('store_failures_total')
+
+async def store(database, executor, kind, batch):
+    loop = asyncio.get_running_loop()
+    with metrics.timer('store_seconds'):
+        await loop.run_in_executor(
+            executor, partial(database.store, **{kind: batch}))
+    metrics.increment('stored_rows_total', sum(
+        len(video_encodings.get('videos', ()))
+        + (video_encodings.get('audio') is not None)
+        for video_encodings in batch))
+    for video_encodings in batch:
+        checkpoints.discard(video_encodings['id'])
+
+async def run(database, owner, processes, refresh):
+    manifest_cache.evict()
+    schedule = Schedule(SCHEDULING_POLICY,
+                        REFRESH_TIMEOUT if refresh else TIMEOUT, WORKERS)
+    limiter = AdaptiveLimiter(
+        INITIAL_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY)
+    queue = asyncio.Queue(WRITE_QUEUE_SIZE)
+    jobs = asyncio.Queue(CLAIM_BATCH)
+    taken = asyncio.Event()
+    parked = deque()
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY,
+        keepalive_timeout=KEEPALIVE_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        writer = asyncio.create_task(write_behind(
+            database, queue, executor,
+            'refreshed_encodings' if refresh else 'video_encodings'))
+        leases = asyncio.create_task(renew_leases(database, executor, owner))
+        try:
+            async with aiohttp.ClientSession(
+                    connector=connector, raise_for_status=True) as session:
+                logging.info("%s %s segments as one of %i process(es)",
+                             owner,
+                             'refreshing' if refresh else 'downloading',
+                             processes)
+                await asyncio.gather(
+                    claim_jobs(database, executor, owner, schedule, jobs,
+                               taken, refresh, limiter, parked),
+                    *(worker(session, jobs, taken, schedule, limiter, queue,
+                             parked)
+                      for _ in range(WORKERS)))
+        finally:
+            await queue.put(None)
+            await writer
+            leases.cancel()
+            released = await loop.run_in_executor(
+                executor, database.release, owner)
+            logging.info("Released %i leases", released)
+            for limit in limiter.limits:
+                logging.info("Request concurrency limit for %s ended at %i "
+                             "(lowest %i, highest %i)", limit.host,
+                             limit.limit, limit.trough, limit.peak)
+            if parked or limiter.trips:
+                logging.warning("Parked %i videos for a later run after "
+                                "%i circuit trip(s)", len(parked),
+                                limiter.trips)
+            schedule.report()
+            metrics.increment('videos_deferred_total', schedule.deferred)
+
+def download(database, processes=1, refresh=False):
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+    with metrics.profile('segments_refresh' if refresh
+                         else 'segments_downloader'):
+        asyncio.run(run(database, owner, processes, refresh))
+
+def replay():
+    outcomes = Counter()
+    planned = 0
+    for svtplay_id, cached in manifest_cache.entries():
+        try:
+            ditto_url(cached['video'])
+            if cached['manifest'] is None:
+                raise ValueError("manifest not cached")
+            manifest = mpd.parse(cached['manifest'])
+            video_reps, audio_rep = select_representations(manifest)
+        except (KeyError, ValueError, TypeError) as ex:
+            logging.warning("Replaying %s failed because %s", svtplay_id, ex)
+            outcomes['failed'] += 1
+            continue
+        progress = checkpoints.load(svtplay_id)
+        requests = sum(
+            sum(size is None for size in
+                plan_encoding(manifest.base_url, rep, progress)[1])
+            for rep in video_reps + [audio_rep])
+        logging.info("Replayed %s - %i video encoding(s), %i segment "
+                     "request(s) planned", svtplay_id, len(video_reps),
+                     requests)
+        outcomes['parsed'] += 1
+        planned += requests
+    logging.info("Replayed %i cached videos, %i parsed and %i failed, "
+                 "%i segment requests planned",
+                 sum(outcomes.values()), outcomes['parsed'],
+                 outcomes['failed'], planned)
+    return outcomes, planned
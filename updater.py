@@ -1,27 +1,43 @@
+import os
 import logging
 import videos_downloader
 import segments_downloader
 import drive_uploader
+import metrics
 from db import DB
 
-def main():
+EXPORT_FILES = ('svtplay_db.csv', 'svtplay_db_intl.csv', 'svtplay_db.bin')
+
+def configure_logging():
     logging.basicConfig(
         filename='log.log',
         format='%(asctime)s %(levelname)s: %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S',
         level=logging.INFO)
 
+def main():
+    configure_logging()
+
     database = DB()
     try:
-        videos_downloader.download(database)
-        segments_downloader.download(database)
-        database.export_csv('svtplay_db.csv')
-        database.export_csv('svtplay_db_intl.csv', international=True)
-        drive_uploader.upload()
+        with metrics.stage('catalog'):
+            videos_downloader.download(database)
+        with metrics.stage('purge'):
+            metrics.increment('purged_videos_total', database.purge())
+        with metrics.stage('segments'):
+            segments_downloader.download(database)
+        with metrics.stage('export'):
+            database.export(*EXPORT_FILES)
+        for file_name in EXPORT_FILES:
+            metrics.increment('export_bytes_total',
+                              os.path.getsize(file_name), file=file_name)
+        with metrics.stage('upload'):
+            drive_uploader.upload(EXPORT_FILES)
     except Exception:
         logging.exception("Unexpected exception")
     finally:
         database.close()
+        metrics.write()
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,18 @@
+import time
 import requests
 import logging
-import json
 import backoff
+import ijson
+import metrics
 
 API_URL = 'https://api.svt.se'
+CHUNK_SIZE = 64 * 1024
+CATALOG_ITEMS = {
+    'errors': 'errors',
+    'data.genresSortedByName.genres.item': 'genre',
+    'data.allEpisodesForInternalUse.item': 'episode_url',
+    'data.programAtillO.flat.item': 'program'
+    }
 QUERY = """query {
     genresSortedByName {
         genres {
@@ -44,21 +53,98 @@ QUERY = """query {
     }
 }"""
 
-@backoff.on_exception(backoff.expo,
-                      requests.exceptions.RequestException,
-                      max_time=300)
+class GraphQLError(Exception):
+    pass
+
 def fetch_graphql():
-    resp = requests.post(f'{API_URL}/contento/graphql', json={'query': QUERY})
+    resp = requests.post(f'{API_URL}/contento/graphql', json={'query': QUERY},
+                         stream=True)
     resp.raise_for_status()
-    return json.loads(resp.text)
+    return resp
+
+def read_chunks(resp):
+    # Only the time spent waiting on the response counts as request latency,
+    # not the catalog update consuming it in between.
+    read_seconds = 0.0
+    chunks = resp.iter_content(CHUNK_SIZE)
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            read_seconds += time.perf_counter() - start
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        metrics.observe('request_seconds',
+                        resp.elapsed.total_seconds() + read_seconds,
+                        endpoint='graphql')
+
+def parse_events(resp):
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    for chunk in read_chunks(resp):
+        parser.send(chunk)
+        yield from events
+        del events[:]
+    parser.close()
+    yield from events
+
+def catalog_items(resp):
+    builder, item_prefix = None, None
+    for prefix, event, value in parse_events(resp):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event in ('end_map', 'end_array'):
+                yield CATALOG_ITEMS[item_prefix], builder.value
+                builder = None
+        elif prefix in CATALOG_ITEMS and event in ('start_map', 'start_array'):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            item_prefix = prefix
+
+def check_errors(kind, item):
+    if kind == 'errors' and item:
+        raise GraphQLError(' | '.join(error['message'] for error in item))
+
+def programs(first_program, items):
+    yield first_program
+    for kind, item in items:
+        check_errors(kind, item)
+        if kind == 'program':
+            yield item
+
+def read_catalog(resp):
+    # GraphQL keeps the order of the query, so genres and episode urls are
+    # complete before the first program arrives.
+    items = catalog_items(resp)
+    genres, episode_urls = [], {}
+    for kind, item in items:
+        check_errors(kind, item)
+        if kind == 'genre':
+            genres.append(item)
+        elif kind == 'episode_url':
+            episode_urls[item['videoSvtId']] = item['urls']['svtplay']
+        elif kind == 'program':
+            return genres, episode_urls, programs(item, items)
+    return genres, episode_urls, iter(())
+
+# The response is streamed into the catalog update, so a connection lost
+# partway through rolls the update back and the whole unit is retried.
+@backoff.on_exception(backoff.expo,
+                      requests.exceptions.RequestException,
+                      max_time=300,
+                      on_backoff=metrics.count_retry)
+def update_catalog(database):
+    with fetch_graphql() as resp:
+        database.update(*read_catalog(resp))
 
 def download(database):
     try:
-        raw = fetch_graphql()
-        if errors := raw.get('errors'):
-            logging.error("GraphQL query failed with %s",
-                          ' | '.join(error['message'] for error in errors))
-        else:
-            database.update(raw)
+        update_catalog(database)
+    except GraphQLError as ex:
+        logging.error("GraphQL query failed with %s", ex)
+    except ijson.JSONError as ex:
+        logging.error("GraphQL response could not be parsed: %s", ex)
     except requests.exceptions.RequestException as ex:
         logging.error("GraphQL query failed with %s - exhausted retries", ex)